@@ -0,0 +1,211 @@
+"""
+ANN Index - Approximate nearest-neighbor search over dense latent vectors
+"""
+
+import time
+
+import numpy as np
+
+from config import Config
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFIndex:
+    """Inverted-file (IVF) index for inner-product or cosine search.
+
+    Vectors are partitioned into ``n_lists`` clusters with spherical k-means
+    and stored contiguously per cluster. A query only scores the vectors in
+    the ``n_probe`` clusters whose centroids match it best, so raising
+    ``n_probe`` trades latency for recall; ``n_probe == n_lists`` is exact.
+    """
+
+    def __init__(self, metric='ip', n_lists=None, n_probe=Config.ANN_N_PROBE,
+                 n_iter=20, seed=42):
+        if metric not in ('ip', 'cosine'):
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        self.metric = metric
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+
+        self.ids = None
+        self.centroids = None
+        self._vectors = None
+        self._offsets = None
+        self._positions = {}
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def build(self, vectors, ids=None):
+        """Cluster ``vectors`` (one row per item) and lay them out by list"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.metric == 'cosine':
+            vectors = _normalize(vectors)
+
+        n_items = len(vectors)
+        ids = np.arange(n_items) if ids is None else np.asarray(ids)
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_items)))
+        n_lists = min(n_lists, n_items) if n_items else 1
+
+        self.centroids = self._kmeans(_normalize(vectors), n_lists)
+        assignment = self._assign(vectors)
+
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=len(self.centroids))
+
+        self._vectors = vectors[order]
+        self.ids = ids[order]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._positions = {item_id: pos for pos, item_id in enumerate(self.ids.tolist())}
+
+        return self
+
+    def search(self, query, k=10, exclude=None, n_probe=None):
+        """Return ``(ids, scores)`` of the approximate top-k for one query.
+
+        ``exclude`` is a collection of ids, or a bitmap with a vectorized
+        ``mask(ids)`` such as a ``SeenSet``.
+        """
+        query = self._prepare_query(query)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+
+        probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        rows = np.concatenate([
+            np.arange(self._offsets[p], self._offsets[p + 1]) for p in probe
+        ])
+
+        return self._top_k(rows, query, k, exclude)
+
+    def exact_search(self, query, k=10, exclude=None):
+        """Brute-force top-k, used as the recall reference"""
+        query = self._prepare_query(query)
+        return self._top_k(np.arange(len(self.ids)), query, k, exclude)
+
+    def vector(self, item_id):
+        """Stored (normalized for cosine) vector of an item"""
+        return self._vectors[self._positions[item_id]]
+
+    def recall_at_k(self, queries, k=10, n_probe=None):
+        """Mean recall@k and per-query latency of ANN vs exact search"""
+        queries = np.atleast_2d(queries)
+        hits = 0
+        total = 0
+        ann_time = 0.0
+        exact_time = 0.0
+
+        for query in queries:
+            start = time.perf_counter()
+            approx_ids, _ = self.search(query, k, n_probe=n_probe)
+            ann_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            exact_ids, _ = self.exact_search(query, k)
+            exact_time += time.perf_counter() - start
+
+            hits += len(np.intersect1d(approx_ids, exact_ids))
+            total += len(exact_ids)
+
+        return {
+            'k': k,
+            'n_probe': min(n_probe or self.n_probe, len(self.centroids)),
+            'n_lists': len(self.centroids),
+            'recall': hits / total if total else 1.0,
+            'ann_ms': ann_time / len(queries) * 1000,
+            'exact_ms': exact_time / len(queries) * 1000
+        }
+
+    def _prepare_query(self, query):
+        query = np.asarray(query, dtype=np.float32)
+        if self.metric == 'cosine':
+            query = _normalize(query)
+        return query
+
+    def _top_k(self, rows, query, k, exclude):
+        scores = self._vectors[rows] @ query
+        candidate_ids = self.ids[rows]
+
+        if exclude and hasattr(exclude, 'mask'):
+            keep = ~exclude.mask(candidate_ids)
+            scores = scores[keep]
+            candidate_ids = candidate_ids[keep]
+        elif exclude:
+            keep = ~np.isin(candidate_ids, np.fromiter(exclude, dtype=candidate_ids.dtype))
+            scores = scores[keep]
+            candidate_ids = candidate_ids[keep]
+
+        k = min(k, len(scores))
+        if k == 0:
+            return candidate_ids[:0], scores[:0]
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidate_ids[top], scores[top]
+
+    def _assign(self, vectors, chunk_size=65536):
+        # Clusters are chosen by direction, for both metrics
+        normalized = _normalize(vectors)
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            block = normalized[start:start + chunk_size]
+            assignment[start:start + chunk_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignment
+
+    def _kmeans(self, normalized, n_lists):
+        rng = np.random.default_rng(self.seed)
+        centroids = normalized[rng.choice(len(normalized), n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            self.centroids = centroids
+            assignment = self._assign(normalized)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, normalized)
+            counts = np.bincount(assignment, minlength=n_lists)
+
+            # Re-seed empty lists with random points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = normalized[rng.choice(len(normalized), empty.sum())]
+
+            centroids = _normalize(sums)
+
+        return centroids
+
+
+if __name__ == '__main__':
+    import sys
+    from db_context import create_db_app
+    from recommendation_engine import RecommendationEngine
+    app = create_db_app()
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with app.app_context():
+        engine = RecommendationEngine()
+        if engine.build_collaborative_model() is None:
+            print("❌ No ratings in the database, nothing to index.")
+            sys.exit(1)
+
+        print(f"\n📐 ANN recall@{k} against exact search")
+        print("=" * 72)
+        for name, index, queries in (
+            ('user → item', engine.item_index, engine.user_factors),
+            ('item → item', engine.item_similarity_index, engine.item_factors)
+        ):
+            for n_probe in (1, 2, 4, 8, 16, 32):
+                report = index.recall_at_k(queries[:500], k, n_probe=n_probe)
+                print(f"{name}  n_probe={report['n_probe']:>3}/{report['n_lists']:<4} "
+                      f"recall={report['recall']:.3f}  "
+                      f"ann={report['ann_ms']:.3f}ms  exact={report['exact_ms']:.3f}ms")
+                if report['n_probe'] == report['n_lists']:
+                    break
+        print("=" * 72)
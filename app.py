@@ -1,7 +1,8 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from datetime import datetime, timedelta
+import asyncio
 import os
 from functools import wraps
 import secrets
@@ -9,23 +10,45 @@ import secrets
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cinesense.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Import db from models and initialize with app
 from models import db
-db.init_app(app)
+from db_context import configure_db
+configure_db(app)
 
 # Initialize extensions
 bcrypt = Bcrypt(app)
 CORS(app)
 
+# Leaner JSON encoding for API responses
+from responses import (FastJSONProvider, InvalidCursor, init_compression,
+                       page_params, paginate, project, requested_fields)
+app.json = FastJSONProvider(app)
+
+# Request latency, SQL and serialization metrics (exposed on /metrics)
+from metrics import REGISTRY, instrument_app, profiler
+instrument_app(app)
+
+# gzip/brotli responses (runs before the metrics hook records the request)
+init_compression(app)
+
 # Global variables for AI components (will be initialized in main)
 recommender = None
 sentiment_analyzer = None
 mood_mapper = None
+event_buffer = None
+recommendation_store = None
+models_ready = False
 
 def login_required(f):
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if 'user_id' not in session:
+                return jsonify({'error': 'Authentication required'}), 401
+            return await f(*args, **kwargs)
+        return decorated_coroutine
+    
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
@@ -35,6 +58,19 @@ def login_required(f):
 
 # Import models after db initialization
 from models import User, Movie, Rating, Review, WatchHistory, UserPreference
+from event_buffer import EventBuffer, BufferFull
+from recommendation_store import RecommendationStore
+from concurrency import run_blocking, with_fallback
+from cache import get_cache
+from http_cache import ResponseCache, catalog_fingerprint
+from config import Config
+
+# Rendered responses of read endpoints, retired when the catalog or models change
+response_cache = ResponseCache()
+response_cache.add_version_source(catalog_fingerprint)
+response_cache.add_version_source(
+    lambda: (Config.RECOMMENDATION_MODEL_VERSION, recommender.content_model_version if recommender else 0)
+)
 
 # Routes
 @app.route('/')
@@ -84,79 +120,225 @@ def logout():
     session.clear()
     return jsonify({'message': 'Logged out successfully'}), 200
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and answering requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: models are loaded and requests won't pay for building them"""
+    status = {
+        'ready': models_ready,
+        'content_model': recommender is not None and recommender._content_model_ready(),
+        'collaborative_model': recommender is not None and recommender.user_factors is not None,
+        'implicit_model': recommender is not None and recommender.implicit_model is not None,
+        'pid': os.getpid()
+    }
+    return jsonify(status), 200 if models_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body = REGISTRY.render() + get_cache().render_metrics()
+    if event_buffer is not None:
+        body += event_buffer.render_metrics()
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/metrics/profile', methods=['GET', 'POST', 'DELETE'])
+def sampling_profile():
+    """POST starts the sampling profiler, DELETE stops it, GET returns folded stacks"""
+    if not Config.PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler is disabled (set PROFILER_ENABLED=1)'}), 403
+    
+    if request.method == 'POST':
+        profiler.start()
+        return jsonify({'message': 'Profiler started'}), 200
+    if request.method == 'DELETE':
+        profiler.stop()
+        return jsonify({'message': 'Profiler stopped', 'stacks': len(profiler.samples)}), 200
+    
+    return profiler.folded(), 200, {'Content-Type': 'text/plain'}
+
+def diversity_weight():
+    """MMR relevance weight configured for the current endpoint (None: keep the ranking)"""
+    weight = Config.DIVERSITY_RELEVANCE_WEIGHTS.get(request.endpoint)
+    return weight if weight is not None and weight < 1 else None
+
+def candidate_count(wanted):
+    """How many candidates to fetch: a larger pool when the endpoint re-ranks for diversity"""
+    return max(wanted, Config.DIVERSITY_POOL) if diversity_weight() is not None else wanted
+
+def precomputed_recommendations(user_id, wanted):
+    """The stored list minus movies watched or rated since it was computed (None: score online)"""
+    stored = recommendation_store.get(user_id)
+    if stored is None:
+        return None
+    
+    recommendations = recommender.seen.get(user_id).filter(stored)
+    # A full stored list may have lost too many entries to fill the page
+    if len(recommendations) < wanted and len(stored) >= Config.PRECOMPUTED_LIMIT:
+        return None
+    return recommendations
+
 @app.route('/api/recommendations', methods=['GET'])
 @login_required
-def get_recommendations():
+async def get_recommendations():
     try:
         user_id = session['user_id']
-        limit = request.args.get('limit', 20, type=int)
+        offset, limit = page_params()
+        wanted = offset + limit + 1  # one extra tells us whether another page exists
         
-        recommendations = recommender.get_hybrid_recommendations(user_id, limit)
+        # Serve the precomputed list when it is still fresh and long enough
+        recommendations = None
+        if wanted <= Config.PRECOMPUTED_LIMIT:
+            recommendations = await run_blocking(precomputed_recommendations, user_id, wanted)
+        
+        if recommendations is not None:
+            source = 'precomputed'
+        else:
+            recommendations = await recommender.get_hybrid_recommendations_async(user_id, candidate_count(wanted))
+            source = 'online'
+        weight = diversity_weight()
+        if weight is not None:
+            recommendations = await run_blocking(recommender.diversify, recommendations, wanted, weight, kind='cpu')
+        
+        page, next_cursor = paginate(recommendations, offset, limit)
         
         return jsonify({
-            'recommendations': recommendations,
+            'recommendations': project(page, requested_fields()),
+            'next_cursor': next_cursor,
+            'source': source,
             'timestamp': datetime.now().isoformat()
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recommendations/mood', methods=['POST'])
 @login_required
+@response_cache.cached(Config.HTTP_CACHE_MOOD_MAX_AGE, vary_user=True, include_body=True)
 def mood_recommendations():
     try:
         data = request.json
         mood = data.get('mood')
         user_id = session['user_id']
+        offset, limit = page_params()
         
-        recommendations = mood_mapper.get_mood_based_recommendations(mood, user_id)
+        wanted = offset + limit + 1
+        
+        recommendations = mood_mapper.get_mood_based_recommendations(mood, user_id, candidate_count(wanted))
+        weight = diversity_weight()
+        if weight is not None:
+            recommendations = recommender.diversify(recommendations, wanted, weight)
+        page, next_cursor = paginate(recommendations, offset, limit)
         
         return jsonify({
             'mood': mood,
+            'recommendations': project(page, requested_fields()),
+            'next_cursor': next_cursor
+        }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recommendations/because-you-liked', methods=['GET'])
+@login_required
+def because_you_liked():
+    try:
+        user_id = session['user_id']
+        limit = request.args.get('limit', 10, type=int)
+        
+        anchor, recommendations = recommender.get_because_you_liked(user_id, limit)
+        
+        return jsonify({
+            'because_you_liked': anchor.to_dict() if anchor else None,
             'recommendations': recommendations
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recommendations/trending', methods=['GET'])
+@response_cache.cached(Config.HTTP_CACHE_TRENDING_MAX_AGE, vary_user=True)
 def trending_recommendations():
     try:
         days = request.args.get('days', 7, type=int)
-        limit = request.args.get('limit', 20, type=int)
+        offset, limit = page_params()
+        wanted = offset + limit + 1
+        decay = request.args.get('mode') == 'decay'
+        # Logged-in users don't get movies they already watched or rated
+        user_id = session.get('user_id')
         
-        # For demo purposes, if no trending data, return popular movies
-        from models import Movie
-        # Filter movies that have valid poster URLs
-        movies = Movie.query.filter(
-            Movie.poster_url.isnot(None),
-            Movie.poster_url != ''
-        ).order_by(Movie.popularity.desc()).limit(limit).all()
+        trending = recommender.get_trending_movies(days, wanted, decay=decay, user_id=user_id)
         
-        trending = [{
-            **movie.to_dict(),
-            'reason': f'Popular movie'
-        } for movie in movies]
+        # Top up with popular movies when there is not enough recent activity
+        if len(trending) < wanted:
+            trending_ids = [movie['id'] for movie in trending]
+            seen = recommender.seen.get(user_id)
+            # Filter movies that have valid poster URLs
+            movies = Movie.query.filter(
+                Movie.poster_url.isnot(None),
+                Movie.poster_url != '',
+                Movie.id.notin_(trending_ids)
+            ).order_by(Movie.popularity.desc()).limit(wanted - len(trending) + len(seen)).all()
+            
+            trending += seen.filter([{
+                **movie.to_dict(),
+                'reason': f'Popular movie'
+            } for movie in movies], wanted - len(trending))
+        
+        page, next_cursor = paginate(trending, offset, limit)
         
         return jsonify({
-            'trending': trending,
-            'period': f'Last {days} days'
+            'trending': project(page, requested_fields()),
+            'next_cursor': next_cursor,
+            'period': 'Right now' if decay else f'Last {days} days'
         }), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/movies/<int:movie_id>', methods=['GET'])
-def get_movie_details(movie_id):
-    movie = Movie.query.get_or_404(movie_id)
-    
-    # Get sentiment analysis
-    sentiment = sentiment_analyzer.analyze_movie_reviews(movie_id)
+@response_cache.cached(Config.HTTP_CACHE_MOVIE_MAX_AGE)
+async def get_movie_details(movie_id):
+    # Movie, sentiment and similar movies don't depend on each other: run them
+    # together and give the optional blocks a deadline so the page takes
+    # max() of the components, not their sum
+    movie, (sentiment, sentiment_ok), (similar, similar_ok), (also_watched, also_watched_ok) = await asyncio.gather(
+        run_blocking(lambda: Movie.query.get_or_404(movie_id).to_dict()),
+        with_fallback(
+            run_blocking(sentiment_analyzer.analyze_movie_reviews, movie_id, kind='sentiment'),
+            Config.DETAIL_SENTIMENT_TIMEOUT,
+            lambda: sentiment_analyzer.cached_movie_summary(movie_id)
+        ),
+        with_fallback(
+            run_blocking(recommender.get_similar_movies, movie_id, 6, kind='cpu'),
+            Config.DETAIL_SIMILAR_TIMEOUT,
+            list
+        ),
+        with_fallback(
+            run_blocking(recommender.get_also_watched, movie_id, 6),
+            Config.DETAIL_SIMILAR_TIMEOUT,
+            list
+        )
+    )
     
-    # Get similar movies
-    similar = recommender.get_similar_movies(movie_id, limit=6)
+    degraded = [name for name, ok in (
+        ('sentiment', sentiment_ok),
+        ('similar_movies', similar_ok),
+        ('also_watched', also_watched_ok)
+    ) if not ok]
+    if degraded:
+        g.skip_response_cache = True
     
     return jsonify({
-        'movie': movie.to_dict(),
+        'movie': movie,
         'sentiment': sentiment,
-        'similar_movies': similar
+        'similar_movies': similar,
+        'also_watched': also_watched,
+        'degraded': degraded
     }), 200
 
 @app.route('/api/rate', methods=['POST'])
@@ -165,6 +347,14 @@ def rate_movie():
     data = request.json
     user_id = session['user_id']
     
+    if event_buffer and event_buffer.buffer_ratings:
+        try:
+            event_buffer.add_rating(user_id, data['movie_id'], data['rating'])
+        except BufferFull:
+            return jsonify({'error': 'Too many pending events, retry shortly'}), 503, {'Retry-After': '1'}
+        
+        return jsonify({'message': 'Rating saved successfully'}), 200
+    
     rating = Rating.query.filter_by(
         user_id=user_id,
         movie_id=data['movie_id']
@@ -181,8 +371,12 @@ def rate_movie():
         )
         db.session.add(rating)
     
+    recommendation_store.invalidate(user_id)
     db.session.commit()
     
+    recommender.record_activity(rating.movie_id, rating.timestamp, user_id=user_id, rating=rating.rating)
+    response_cache.invalidate_user(user_id)
+    
     # Update recommendations in real-time
     recommender.update_user_profile(user_id)
     
@@ -194,6 +388,14 @@ def add_watch_history():
     data = request.json
     user_id = session['user_id']
     
+    if event_buffer:
+        try:
+            event_buffer.add_watch(user_id, data['movie_id'])
+        except BufferFull:
+            return jsonify({'error': 'Too many pending events, retry shortly'}), 503, {'Retry-After': '1'}
+        
+        return jsonify({'message': 'Added to watch history'}), 200
+    
     history = WatchHistory(
         user_id=user_id,
         movie_id=data['movie_id'],
@@ -201,8 +403,12 @@ def add_watch_history():
     )
     
     db.session.add(history)
+    recommendation_store.invalidate(user_id)
     db.session.commit()
     
+    recommender.record_activity(history.movie_id, history.watched_at, user_id=user_id)
+    response_cache.invalidate_user(user_id)
+    
     return jsonify({'message': 'Added to watch history'}), 200
 
 @app.route('/api/preferences', methods=['GET', 'POST'])
@@ -223,7 +429,9 @@ def user_preferences():
         pref.favorite_directors = ','.join(data.get('directors', []))
         pref.preferred_languages = ','.join(data.get('languages', []))
         
+        recommendation_store.invalidate(user_id)
         db.session.commit()
+        response_cache.invalidate_user(user_id)
         
         return jsonify({'message': 'Preferences saved'}), 200
     
@@ -234,19 +442,43 @@ def user_preferences():
         return jsonify({}), 200
 
 @app.route('/api/search', methods=['GET'])
+@response_cache.cached(Config.HTTP_CACHE_SEARCH_MAX_AGE)
 def search_movies():
     query = request.args.get('q', '')
-    limit = request.args.get('limit', 20, type=int)
+    try:
+        offset, limit = page_params()
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    wanted = offset + limit + 1
     
     # Filter movies that have valid poster URLs
     movies = Movie.query.filter(
         Movie.title.ilike(f'%{query}%'),
         Movie.poster_url.isnot(None),
         Movie.poster_url != ''
-    ).limit(limit).all()
+    ).limit(wanted).all()
+    
+    # Fill up with movies whose plot, genres or cast match the query
+    if query and len(movies) < wanted:
+        title_ids = {movie.id for movie in movies}
+        matches = [
+            movie_id for movie_id, _ in recommender.search_by_text(query, wanted * 2)
+            if movie_id not in title_ids
+        ]
+        if matches:
+            matched = Movie.query.filter(
+                Movie.id.in_(matches),
+                Movie.poster_url.isnot(None),
+                Movie.poster_url != ''
+            ).all()
+            matched.sort(key=lambda movie: matches.index(movie.id))
+            movies += matched[:wanted - len(movies)]
+    
+    page, next_cursor = paginate(movies, offset, limit)
     
     return jsonify({
-        'results': [movie.to_dict() for movie in movies]
+        'results': project([movie.to_dict() for movie in page], requested_fields()),
+        'next_cursor': next_cursor
     }), 200
 
 @app.route('/api/cold-start', methods=['POST'])
@@ -262,7 +494,9 @@ def cold_start_setup():
         preferred_languages=','.join(data.get('languages', []))
     )
     db.session.add(pref)
+    recommendation_store.invalidate(user_id)
     db.session.commit()
+    response_cache.invalidate_user(user_id)
     
     # Get initial recommendations
     recommendations = recommender.cold_start_recommendations(user_id)
@@ -274,7 +508,7 @@ def cold_start_setup():
 
 def initialize_app():
     """Initialize the application with models and AI components"""
-    global recommender, sentiment_analyzer, mood_mapper
+    global recommender, sentiment_analyzer, mood_mapper, event_buffer, recommendation_store
     
     with app.app_context():
         # Import after app context is ready
@@ -286,7 +520,8 @@ def initialize_app():
         # Initialize AI components
         recommender = RecommendationEngine()
         sentiment_analyzer = SentimentAnalyzer()
-        mood_mapper = MoodMapper()
+        mood_mapper = MoodMapper(seen=recommender.seen, features=recommender.features)
+        recommendation_store = RecommendationStore()
         
         # Create database tables
         db.create_all()
@@ -294,8 +529,92 @@ def initialize_app():
         # Initialize sample data
         from data_loader import load_sample_data
         if Movie.query.count() == 0:
-            load_sample_data()
+            load_sample_data(engine=recommender)
+        
+        recommender.trending.load_from_db()
+    
+    # Batch watch/rating writes instead of committing once per event
+    if Config.EVENT_BUFFER_ENABLED:
+        event_buffer = EventBuffer(
+            app,
+            max_batch=Config.EVENT_BUFFER_MAX_BATCH,
+            flush_interval=Config.EVENT_BUFFER_FLUSH_INTERVAL,
+            max_queue=Config.EVENT_BUFFER_MAX_QUEUE,
+            put_timeout=Config.EVENT_BUFFER_PUT_TIMEOUT,
+            max_retries=Config.EVENT_BUFFER_MAX_RETRIES,
+            buffer_ratings=Config.EVENT_BUFFER_RATINGS
+        )
+        event_buffer.add_listener(_on_events_flushed)
+        event_buffer.start()
+
+def create_app():
+    """App factory for WSGI servers: set up components and return the app.
+    
+    Models, scikit-learn and TextBlob are not loaded here; they are built
+    and imported on first use, so startup only pays for Flask and the DB.
+    """
+    initialize_app()
+    return app
+
+def warm_up_models():
+    """Build every model up front instead of on the first request"""
+    global models_ready
+    
+    with app.app_context():
+        recommender.build_content_based_model()
+        if Config.CONTENT_NEIGHBORS:
+            # Similar-movie lists, inherited by forked workers
+            recommender.build_content_neighbors(k=Config.CONTENT_NEIGHBORS, workers=Config.CONTENT_NEIGHBOR_WORKERS)
+        recommender.build_collaborative_model()
+        if Config.IMPLICIT_ENABLED:
+            recommender.build_implicit_model()
+        recommender._taste_profiles_ready()
+        recommender.co_occurrence.ensure_loaded()
+        sentiment_analyzer.analyze_text('warm up')  # imports TextBlob/NLTK
+    
+    models_ready = True
+
+def before_fork():
+    """Release threads and connections that must not be shared with forked workers"""
+    if event_buffer is not None:
+        event_buffer.stop()
+    
+    with app.app_context():
+        db.engine.dispose()
+
+def after_fork():
+    """Per-worker setup after fork: each worker flushes its own event buffer"""
+    if event_buffer is not None:
+        event_buffer.start()
+
+def _on_events_flushed(kind, events):
+    """Update trending counters, seen sets, co-occurrence lists and models once per flushed batch"""
+    time_field = 'watched_at' if kind == 'watch' else 'timestamp'
+    recommender.trending.record_many(
+        (event['movie_id'], event[time_field]) for event in events
+    )
+    recommender.co_occurrence.record_many(
+        (event['user_id'], event['movie_id'], event.get('rating')) for event in events
+    )
+    for event in events:
+        recommender.seen.add(event['user_id'], event['movie_id'])
+    user_ids = {event['user_id'] for event in events}
+    for user_id in user_ids:
+        response_cache.invalidate_user(user_id)
+    
+    # Stored lists may contain the movies just watched or rated
+    recommendation_store.invalidate(*user_ids)
+    db.session.commit()
+    
+    if kind == 'rating':
+        for event in events:
+            recommender.update_taste_profile(event['user_id'], event['movie_id'], event['rating'])
+        
+        # One rebuild covers every user in the batch
+        recommender.update_user_profile(events[-1]['user_id'])
 
 if __name__ == '__main__':
+    # Development server; use serve.py for multi-process serving
     initialize_app()
+    models_ready = True  # models build lazily on first use
     app.run(debug=True, host='0.0.0.0', port=5000)
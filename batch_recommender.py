@@ -0,0 +1,415 @@
+"""
+Batch Recommender - Hybrid recommendations for many users at once
+
+Usage:
+    python batch_recommender.py --output recs.jsonl [--limit 20] [--workers 4] [--out-of-core]
+"""
+
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from config import Config
+
+COLLABORATIVE_REASON = 'Users with similar taste enjoyed this'
+CONTENT_REASON = 'Similar content to your selection'
+IMPLICIT_REASON = 'Watched by people who watch what you watch'
+COLD_START_REASON = 'Popular in your preferred genres'
+
+
+class BatchRecommender:
+    """Score hybrid recommendations for blocks of users with dense matrix products.
+
+    Everything the single-user path fetches per request is loaded once in
+    ``prepare()``: the sparse ratings matrix, the SVD factors and the
+    content embeddings. A block of users is then scored with one GEMM for
+    the collaborative part, one for the similarity of each user's taste
+    vector to the catalog (kept for their top ``limit`` movies, like the
+    online path), plus one GEMM over the implicit
+    (watch history) factors for users with enough views, using the same
+    weights as ``RecommendationEngine.get_hybrid_recommendations``.
+    """
+
+    def __init__(self, engine=None, limit=Config.RECOMMENDATIONS_LIMIT, block_size=1024,
+                 workers=4, content_neighbors=5, top_rated=3,
+                 neighbor_workers=Config.CONTENT_NEIGHBOR_WORKERS, progress=None, out_of_core=None):
+        if engine is None:
+            from recommendation_engine import RecommendationEngine
+            engine = RecommendationEngine()
+
+        self.engine = engine
+        self.limit = limit
+        self.block_size = block_size
+        self.workers = workers
+        self.content_neighbors = content_neighbors
+        self.top_rated = top_rated
+        self.neighbor_workers = neighbor_workers
+        self.progress = progress
+        self.out_of_core = out_of_core
+        self._cold_start_cache = {}
+
+    def prepare(self):
+        """Build the models and load everything scoring needs (requires an app context)"""
+        from models import db, User, Movie, Rating, UserPreference, WatchHistory
+
+        engine = self.engine
+        engine.build_content_based_model()
+        has_ratings = engine.build_collaborative_model(out_of_core=self.out_of_core) is not None
+
+        # One content snapshot, so ids, rows and embeddings agree throughout
+        content = engine.content_index
+        self.catalog_ids = np.array(content.movie_ids)
+        n_movies = len(self.catalog_ids)
+
+        # Movie attributes aligned with the content model rows
+        attributes = {
+            row.id: row for row in db.session.query(
+                Movie.id, Movie.poster_url, Movie.genres, Movie.language,
+                Movie.popularity, Movie.avg_rating
+            )
+        }
+        movies = [attributes[movie_id] for movie_id in content.movie_ids]
+        self.has_poster = np.array([bool(m.poster_url) for m in movies], dtype=bool)
+        self.genres = [set(m.genres.split(',')) if m.genres else set() for m in movies]
+        self.languages = [m.language for m in movies]
+        self.popularity_order = np.lexsort((
+            -np.array([m.avg_rating or 0.0 for m in movies]),
+            -np.array([m.popularity or 0.0 for m in movies])
+        ))
+
+        # Content boost from taste vectors; the dense-similarity content model has no
+        # embeddings and uses the neighbors of each user's top-rated movies instead
+        self.embeddings = content.embeddings
+        if self.embeddings is None:
+            self.neighbors = engine.build_content_neighbors(
+                k=self.content_neighbors, workers=self.neighbor_workers, progress=self.progress
+            )
+
+        if has_ratings:
+            # Map rated-item columns onto content model rows
+            item_rows = np.array([content.movie_index.get(m, -1) for m in engine.item_ids.tolist()])
+            self.item_mask = item_rows >= 0
+            self.item_rows = item_rows[self.item_mask]
+            self.item_factors = np.ascontiguousarray(engine.item_factors[self.item_mask], dtype=np.float32)
+            self.user_factors = np.asarray(engine.user_factors, dtype=np.float32)
+
+            user_item_matrix = engine.user_item_matrix
+            if user_item_matrix is None:
+                # Trained out of core: assemble the (compact) CSR from streamed chunks
+                from collaborative_training import ratings_matrix
+                user_item_matrix = ratings_matrix(engine.user_ids, engine.item_ids)
+
+            ratings = user_item_matrix.tocoo()
+            keep = item_rows[ratings.col] >= 0
+            self.ratings = sparse.csr_matrix(
+                (ratings.data[keep], (ratings.row[keep], item_rows[ratings.col[keep]])),
+                shape=(ratings.shape[0], n_movies)
+            )
+            self.rating_counts = np.diff(user_item_matrix.indptr)
+            if self.embeddings is None:
+                self.top_rated_matrix = self._top_rated_indicator()
+        else:
+            self.rating_counts = np.zeros(0, dtype=np.int64)
+
+        self.implicit = Config.IMPLICIT_ENABLED and engine.build_implicit_model() is not None
+        if self.implicit:
+            # Same mapping for the implicit model's items
+            item_rows = np.array([content.movie_index.get(m, -1) for m in engine.implicit_item_ids.tolist()])
+            self.implicit_item_mask = item_rows >= 0
+            self.implicit_item_rows = item_rows[self.implicit_item_mask]
+            self.implicit_item_factors = np.ascontiguousarray(
+                engine.implicit_model.item_factors[self.implicit_item_mask], dtype=np.float32
+            )
+            self.implicit_user_factors = engine.implicit_model.user_factors
+
+            watched = engine.implicit_counts.tocoo()
+            keep = item_rows[watched.col] >= 0
+            self.watched = sparse.csr_matrix(
+                (np.ones(keep.sum(), dtype=np.float32), (watched.row[keep], item_rows[watched.col[keep]])),
+                shape=(watched.shape[0], n_movies)
+            )
+            self.watch_counts = np.diff(engine.implicit_counts.indptr)
+
+        self.user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+        self.user_positions = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+        # Watched or rated movies per user (never recommended), like the online seen sets
+        pairs = [
+            (self.user_positions[user_id], content.movie_index[movie_id])
+            for user_id, movie_id in db.session.query(Rating.user_id, Rating.movie_id).union(
+                db.session.query(WatchHistory.user_id, WatchHistory.movie_id)
+            ).yield_per(10000)
+            if user_id in self.user_positions and movie_id in content.movie_index
+        ]
+        seen_rows, seen_cols = (np.array(column, dtype=np.int64) for column in zip(*pairs)) if pairs else ([], [])
+        self.seen = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (seen_rows, seen_cols)),
+            shape=(len(self.user_ids), n_movies)
+        )
+        self.preferences = {
+            pref.user_id: (
+                tuple(pref.favorite_genres.split(',')) if pref.favorite_genres else (),
+                tuple(pref.preferred_languages.split(',')) if pref.preferred_languages else ()
+            )
+            for pref in UserPreference.query.all()
+        }
+
+        return self
+
+    def _taste_boost(self, rows, seen):
+        """Similarity of each user's taste vector to their top ``limit`` unseen movies, 0 elsewhere"""
+        ratings = self.ratings[rows]
+        weights = ratings.copy()
+        weights.data = weights.data - Config.TASTE_RATING_CENTER
+
+        profiles = np.asarray(weights @ self.embeddings, dtype=np.float32)
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        similarity = (profiles / norms) @ self.embeddings.T
+
+        seen_rows, seen_cols = seen.nonzero()
+        similarity[seen_rows, seen_cols] = -np.inf
+
+        k = min(self.limit, similarity.shape[1])
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(similarity, top, axis=1)
+        top_values[~np.isfinite(top_values)] = 0.0
+
+        boost = np.zeros_like(similarity)
+        np.put_along_axis(boost, top, top_values, axis=1)
+        return boost
+
+    def _top_rated_indicator(self):
+        """Sparse users x movies matrix with a 1 at each user's top-rated movies"""
+        ratings = self.ratings.tocsr()
+        ratings.sort_indices()
+        rows = np.repeat(np.arange(ratings.shape[0]), np.diff(ratings.indptr))
+
+        # Rank each rating within its row, highest first
+        order = np.lexsort((-ratings.data, rows))
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - ratings.indptr[rows[order]]
+
+        keep = ranks < self.top_rated
+        return sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.float32), (rows[keep], ratings.indices[keep])),
+            shape=ratings.shape
+        )
+
+    def recommend_block(self, user_ids):
+        """Return ``[(user_id, [recommendation, ...]), ...]`` for one block of users"""
+        engine = self.engine
+        warm, cold = [], []
+
+        for user_id in user_ids:
+            row = engine.user_index.get(user_id)
+            collaborative = row is not None and self.rating_counts[row] >= Config.MIN_RATINGS_FOR_COLLABORATIVE
+            implicit_row = engine.implicit_user_index.get(user_id) if self.implicit else None
+            if implicit_row is not None and self.watch_counts[implicit_row] < Config.MIN_WATCHES_FOR_IMPLICIT:
+                implicit_row = None
+            if collaborative or implicit_row is not None:
+                warm.append((user_id, row, collaborative, implicit_row))
+            else:
+                cold.append(user_id)
+
+        results = {}
+        if warm:
+            results.update(self._score_warm(warm))
+        for user_id in cold:
+            results[user_id] = self._cold_start(user_id, self._seen_row(user_id))
+
+        return [(user_id, results[user_id]) for user_id in user_ids]
+
+    def _seen_row(self, user_id):
+        position = self.user_positions.get(user_id)
+        if position is None:
+            return sparse.csr_matrix((1, len(self.catalog_ids)), dtype=np.float32)
+        return self.seen[position]
+
+    def _score_warm(self, warm):
+        n_movies = len(self.catalog_ids)
+        seen = sparse.vstack([self._seen_row(user_id) for user_id, _, _, _ in warm], format='csr')
+        scores = np.zeros((len(warm), n_movies), dtype=np.float32)
+        boost = np.zeros((len(warm), n_movies), dtype=np.float32)
+        implicit_scores = np.zeros((len(warm), n_movies), dtype=np.float32)
+
+        # Block positions of users with ratings, enough ratings, and enough views
+        rated = np.array([i for i, (_, row, _, _) in enumerate(warm) if row is not None], dtype=np.int64)
+        rows = np.array([warm[i][1] for i in rated], dtype=np.int64)
+        collab = np.array([i for i, entry in enumerate(warm) if entry[2]], dtype=np.int64)
+        viewers = np.array([i for i, entry in enumerate(warm) if entry[3] is not None], dtype=np.int64)
+
+        # Collaborative part: one GEMM for the whole block
+        if len(collab):
+            collab_rows = np.array([warm[i][1] for i in collab])
+            scores[np.ix_(collab, self.item_rows)] = Config.COLLABORATIVE_WEIGHT * (
+                self.user_factors[collab_rows] @ self.item_factors.T
+            )
+
+        # Content part: taste vectors (or neighbors of each user's top-rated movies)
+        if len(rated):
+            if self.embeddings is not None:
+                boost[rated] = self._taste_boost(rows, seen[rated])
+            else:
+                boost[rated] = (self.top_rated_matrix[rows] @ self.neighbors).toarray()
+            scores += Config.CONTENT_WEIGHT * boost
+
+        # Implicit part: watch-history factors, never for movies already watched
+        if len(viewers):
+            implicit_rows = np.array([warm[i][3] for i in viewers])
+            implicit_scores[np.ix_(viewers, self.implicit_item_rows)] = Config.IMPLICIT_WEIGHT * (
+                self.implicit_user_factors[implicit_rows] @ self.implicit_item_factors.T
+            )
+            watched_rows, watched_cols = self.watched[implicit_rows].nonzero()
+            implicit_scores[viewers[watched_rows], watched_cols] = 0.0
+            scores += implicit_scores
+
+        # Never recommend watched or rated movies, or movies without posters
+        seen_rows, seen_cols = seen.nonzero()
+        scores[seen_rows, seen_cols] = -np.inf
+        scores[:, ~self.has_poster] = -np.inf
+
+        collaborative = np.zeros(n_movies, dtype=bool)
+        collaborative[self.item_rows] = True
+
+        k = min(self.limit, n_movies)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        results = {}
+        for i, (user_id, _, is_collab, _) in enumerate(warm):
+            recs = []
+            for col, score in zip(top[i].tolist(), top_scores[i].tolist()):
+                if score == -np.inf:
+                    break
+                reasons = []
+                if is_collab and collaborative[col]:
+                    reasons.append(COLLABORATIVE_REASON)
+                if boost[i, col] > 0:
+                    reasons.append(CONTENT_REASON)
+                if implicit_scores[i, col] > 0:
+                    reasons.append(IMPLICIT_REASON)
+                reason = ' & '.join(reasons) or CONTENT_REASON
+                recs.append({
+                    'movie_id': int(self.catalog_ids[col]),
+                    'score': round(score, 6),
+                    'reason': reason
+                })
+            results[user_id] = recs
+
+        return results
+
+    def _cold_start(self, user_id, seen):
+        """Popular movies for the user's genres/languages that the user has not seen.
+
+        The ranked list is shared per preference combination and only
+        extended when a user has seen more of it than it has spare rows.
+        """
+        key = self.preferences.get(user_id, ((), ()))
+        wanted = self.limit + seen.nnz
+        # (rows, n asked for); fewer rows than asked for means the catalog ran out
+        cached = self._cold_start_cache.get(key)
+        if cached is None or (len(cached[0]) < wanted and len(cached[0]) == cached[1]):
+            n = max(wanted, 2 * self.limit)
+            cached = self._cold_start_cache[key] = (self._cold_start_rows(key, n), n)
+
+        rows = cached[0]
+        if seen.nnz:
+            rows = rows[~np.isin(rows, seen.indices)]
+        return [{
+            'movie_id': int(self.catalog_ids[row]),
+            'score': None,
+            'reason': COLD_START_REASON
+        } for row in rows[:self.limit].tolist()]
+
+    def _cold_start_rows(self, key, n):
+        """Catalog rows of the ``n`` most popular movies with posters matching the preferences"""
+        genres, languages = set(key[0]), set(key[1])
+        rows = []
+        for row in self.popularity_order.tolist():
+            if not self.has_poster[row]:
+                continue
+            if genres and not genres & self.genres[row]:
+                continue
+            if languages and self.languages[row] not in languages:
+                continue
+            rows.append(row)
+            if len(rows) >= n:
+                break
+        return np.array(rows, dtype=np.int64)
+
+    def iter_recommendations(self, user_ids=None):
+        """Yield ``(user_id, recommendations)`` in user order, scoring blocks in a thread pool"""
+        user_ids = self.user_ids if user_ids is None else list(user_ids)
+        blocks = (user_ids[i:i + self.block_size] for i in range(0, len(user_ids), self.block_size))
+
+        # Keep a bounded window of blocks in flight so output streams in order
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for block in blocks:
+                pending.append(executor.submit(self.recommend_block, block))
+                if len(pending) >= self.workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def run(self, out, user_ids=None):
+        """Write one JSON line per user to ``out``; returns the number of users written"""
+        count = 0
+        for user_id, recs in self.iter_recommendations(user_ids):
+            out.write(json.dumps({'user_id': user_id, 'recommendations': recs}) + '\n')
+            count += 1
+        return count
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write hybrid recommendations for many users as JSONL')
+    parser.add_argument('--output', '-o', default='-', help='output file (default: stdout)')
+    parser.add_argument('--limit', type=int, default=Config.RECOMMENDATIONS_LIMIT)
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--neighbor-workers', type=int, default=Config.CONTENT_NEIGHBOR_WORKERS,
+                        help='processes for the content neighbor build')
+    parser.add_argument('--out-of-core', action='store_true', default=None,
+                        help='train the collaborative model from streamed rating chunks')
+    parser.add_argument('--users', help='comma-separated user ids (default: all users)')
+    args = parser.parse_args()
+
+    from db_context import create_db_app
+    app = create_db_app()
+
+    with app.app_context():
+        start = time.perf_counter()
+        from content_neighbors import print_progress
+        batch = BatchRecommender(
+            limit=args.limit,
+            block_size=args.block_size,
+            workers=args.workers,
+            neighbor_workers=args.neighbor_workers,
+            out_of_core=args.out_of_core,
+            progress=print_progress()
+        ).prepare()
+        print(f"📦 Models and ratings loaded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        user_ids = [int(u) for u in args.users.split(',')] if args.users else None
+
+        start = time.perf_counter()
+        out = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            count = batch.run(out, user_ids)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        elapsed = time.perf_counter() - start
+        print(f"🎉 Wrote recommendations for {count} users in {elapsed:.1f}s", file=sys.stderr)
@@ -0,0 +1,320 @@
+"""
+Benchmark Suite - Time recommendation engine stages and API endpoints
+
+Usage:
+    python benchmark.py [--movies 2000 --users 10000 --ratings 200000 ...]
+                        [--output baseline.json] [--compare baseline.json]
+    python benchmark.py --startup-only   - cold start and -X importtime breakdown
+
+Generates a synthetic dataset in a scratch SQLite database (or uses
+--database), times each engine stage and endpoint, records peak RSS and
+writes the results as JSON. With --compare, medians are checked against a
+previous baseline and the run fails when a stage regressed.
+"""
+
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Benchmark:
+    """Collects timings for named stages"""
+
+    def __init__(self, repeat=20, verbose=True):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = {}
+
+    def measure(self, name, fn, repeat=None, items=None):
+        """Call ``fn(i)`` ``repeat`` times and record latency statistics"""
+        repeat = repeat or self.repeat
+        durations = []
+        error = None
+
+        for i in range(repeat):
+            start = time.perf_counter()
+            try:
+                fn(i)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            durations.append((time.perf_counter() - start) * 1000)
+
+        result = {'runs': len(durations), 'peak_rss_mb': round(peak_rss_mb(), 1)}
+        if durations:
+            ordered = sorted(durations)
+            result.update({
+                'mean_ms': round(statistics.fmean(durations), 3),
+                'p50_ms': round(statistics.median(durations), 3),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                'min_ms': round(ordered[0], 3),
+                'max_ms': round(ordered[-1], 3)
+            })
+            if items:
+                result['items_per_sec'] = round(items / (result['mean_ms'] / 1000), 1)
+        if error:
+            result['error'] = error
+
+        self.results[name] = result
+
+        if self.verbose:
+            if 'p50_ms' in result:
+                print(f"  {name:<42} p50={result['p50_ms']:>10.2f}ms  p95={result['p95_ms']:>10.2f}ms  "
+                      f"rss={result['peak_rss_mb']:.0f}MB")
+            if error:
+                print(f"  {name:<42} ❌ {error}")
+
+        return result
+
+
+def run_benchmarks(app_module, bench, sample_size=50):
+    """Time every engine stage and endpoint against the current database"""
+    from models import db, User, Movie, Rating
+    from batch_recommender import BatchRecommender
+
+    app = app_module.app
+
+    with app.app_context():
+        engine = app_module.recommender
+        movie_ids = [m for (m,) in db.session.query(Movie.id)]
+        warm_users = [u for (u,) in db.session.query(Rating.user_id)
+                      .group_by(Rating.user_id)
+                      .having(db.func.count(Rating.id) >= 5)
+                      .limit(sample_size * 10)]
+        all_users = [u for (u,) in db.session.query(User.id).limit(sample_size * 10)]
+
+        rng = random.Random(0)
+        sample_movies = rng.sample(movie_ids, min(sample_size, len(movie_ids)))
+        sample_warm = rng.sample(warm_users, min(sample_size, len(warm_users))) or all_users[:1]
+        sample_users = rng.sample(all_users, min(sample_size, len(all_users)))
+
+        print("\n⚙️  Engine stages")
+        bench.measure('engine.build_content_based_model', lambda i: engine.build_content_based_model(), repeat=3)
+        bench.measure('engine.build_collaborative_model', lambda i: engine.build_collaborative_model(), repeat=3)
+        bench.measure('engine.trending.load_from_db', lambda i: engine.trending.load_from_db(), repeat=3)
+        bench.measure('engine.get_similar_movies',
+                      lambda i: engine.get_similar_movies(sample_movies[i % len(sample_movies)]))
+        bench.measure('engine.get_collaborative_recommendations',
+                      lambda i: engine.get_collaborative_recommendations(sample_warm[i % len(sample_warm)], 20))
+        bench.measure('engine.get_hybrid_recommendations',
+                      lambda i: engine.get_hybrid_recommendations(sample_warm[i % len(sample_warm)], 20))
+        bench.measure('engine.cold_start_recommendations',
+                      lambda i: engine.cold_start_recommendations(sample_users[i % len(sample_users)], 20))
+        bench.measure('engine.get_trending_movies', lambda i: engine.get_trending_movies(7, 20))
+        bench.measure('sentiment.analyze_movie_reviews',
+                      lambda i: app_module.sentiment_analyzer.analyze_movie_reviews(sample_movies[i % len(sample_movies)]))
+        bench.measure('mood.get_mood_based_recommendations',
+                      lambda i: app_module.mood_mapper.get_mood_based_recommendations(
+                          'happy', sample_users[i % len(sample_users)]))
+
+        batch = BatchRecommender(engine)
+        bench.measure('batch.prepare', lambda i: batch.prepare(), repeat=1)
+        n_users = len(batch.user_ids)
+        bench.measure('batch.all_users', lambda i: sum(1 for _ in batch.iter_recommendations()),
+                      repeat=1, items=n_users)
+
+    print("\n🌐 Endpoints")
+    client = app.test_client()
+
+    def as_user(user_id):
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+
+    def get(url, user_id=None):
+        if user_id is not None:
+            as_user(user_id)
+        response = client.get(url)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        return response
+
+    def post(url, payload, user_id):
+        as_user(user_id)
+        response = client.post(url, json=payload)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        return response
+
+    bench.measure('GET /api/recommendations',
+                  lambda i: get('/api/recommendations', sample_warm[i % len(sample_warm)]))
+    bench.measure('GET /api/movies/<id>',
+                  lambda i: get(f'/api/movies/{sample_movies[i % len(sample_movies)]}'))
+    bench.measure('GET /api/recommendations/trending',
+                  lambda i: get('/api/recommendations/trending?days=7'))
+    bench.measure('GET /api/search',
+                  lambda i: get(f'/api/search?q={["dark", "love", "space", "crime"][i % 4]}'))
+    bench.measure('POST /api/recommendations/mood',
+                  lambda i: post('/api/recommendations/mood', {'mood': 'happy'}, sample_users[i % len(sample_users)]))
+
+
+HEAVY_MODULES = ('pandas', 'scipy', 'sklearn', 'textblob', 'nltk')
+
+STARTUP_SCRIPTS = {
+    'startup.create_app': 'import app; app.create_app()',
+    'startup.db_context': 'import db_context; db_context.create_db_app()'
+}
+
+
+def parse_importtime(stderr):
+    """``[(module, self_us, cumulative_us, depth), ...]`` from ``-X importtime`` output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def measure_startup(bench, top=15):
+    """Time cold startup paths in fresh interpreters with an ``-X importtime`` breakdown"""
+    import subprocess
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    print("\n🚀 Startup")
+
+    for name, script in STARTUP_SCRIPTS.items():
+        timed_script = f"import time; _t = time.perf_counter(); {script}; print(time.perf_counter() - _t)"
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', timed_script],
+            cwd=repo_dir, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            bench.results[name] = {'runs': 0, 'error': proc.stderr.strip().splitlines()[-1]}
+            print(f"  {name:<42} ❌ {bench.results[name]['error']}")
+            continue
+
+        modules = parse_importtime(proc.stderr)
+        # Last stdout line is the timing; the app may print while starting up
+        elapsed_ms = float(proc.stdout.strip().splitlines()[-1]) * 1000
+        top_level = sorted((m for m in modules if m[3] <= 1), key=lambda m: -m[2])[:top]
+        loaded = {m[0].split('.')[0] for m in modules}
+
+        bench.results[name] = {
+            'runs': 1,
+            'p50_ms': round(elapsed_ms, 3),
+            'import_ms': round(sum(m[1] for m in modules) / 1000, 3),
+            'heavy_modules_loaded': sorted(loaded.intersection(HEAVY_MODULES)),
+            'top_imports': [{'module': m[0], 'cumulative_ms': round(m[2] / 1000, 3)} for m in top_level]
+        }
+
+        result = bench.results[name]
+        print(f"  {name:<42} total={elapsed_ms:>8.1f}ms  imports={result['import_ms']:.1f}ms  "
+              f"heavy={','.join(result['heavy_modules_loaded']) or 'none'}")
+        for entry in result['top_imports'][:5]:
+            print(f"      {entry['module']:<40} {entry['cumulative_ms']:>8.1f}ms")
+
+
+def compare(results, baseline, threshold):
+    """Print p50 changes against a baseline; returns the names of regressed stages"""
+    regressions = []
+
+    print(f"\n📈 Comparison with baseline (regression threshold {threshold:.0%})")
+    print("=" * 80)
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name, {}).get('p50_ms')
+        after = result.get('p50_ms')
+        if before is None or after is None:
+            continue
+
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '❌ regression'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '✅ faster'
+        print(f"  {name:<42} {before:>10.2f}ms → {after:>10.2f}ms  {change:>+7.1%}  {flag}")
+    print("=" * 80)
+
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark engine stages and endpoints')
+    parser.add_argument('--database', help='database URL (default: scratch SQLite file)')
+    parser.add_argument('--no-generate', action='store_true', help='use the existing data as-is')
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--ratings', type=int, default=200000)
+    parser.add_argument('--reviews', type=int, default=10000)
+    parser.add_argument('--watch', type=int, default=400000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed p50 slowdown (0.2 = 20%%)')
+    parser.add_argument('--startup-only', action='store_true', help='only measure cold startup and import time')
+    args = parser.parse_args()
+
+    scratch_dir = None
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix='cinesense-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+    import app as app_module
+    from synthetic_data import generate
+
+    bench = Benchmark(repeat=args.repeat)
+
+    dataset = None
+    if not args.no_generate and not args.startup_only:
+        with app_module.app.app_context():
+            start = time.perf_counter()
+            dataset = generate(args.movies, args.users, args.ratings, args.reviews, args.watch)
+            print(f"⏱️  Data generated in {time.perf_counter() - start:.1f}s")
+
+    measure_startup(bench)
+
+    start = time.perf_counter()
+    app_module.initialize_app()
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    bench.results['app.initialize_app'] = {'runs': 1, 'p50_ms': round(startup_ms, 3),
+                                           'peak_rss_mb': round(peak_rss_mb(), 1)}
+    if not args.startup_only:
+        run_benchmarks(app_module, bench)
+
+    if app_module.event_buffer:
+        app_module.event_buffer.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'database': os.environ['DATABASE_URL'],
+            'dataset': dataset,
+            'peak_rss_mb': round(peak_rss_mb(), 1)
+        },
+        'results': bench.results
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output} (peak RSS {report['meta']['peak_rss_mb']:.0f}MB)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(bench.results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,482 @@
+"""
+Cache - Shared cache with an in-process LRU backend and a Redis-protocol backend
+
+Usage:
+    python cache.py serve [port]   - Run a local Redis-protocol stand-in server
+    python cache.py ping           - Check the server configured by CACHE_URL
+
+Set CACHE_URL=redis://host:port/db to share cached results between
+worker processes (any Redis-compatible server, or the stand-in above);
+without it every process keeps its own in-memory LRU.
+
+Counters (namespace generations and ``Namespace.incr`` keys) are stored
+without a TTL and must never be evicted, or stale entries keyed by an
+older value come back; on Redis use a ``volatile-*`` eviction policy.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlparse
+
+from config import Config
+
+COMPRESS_THRESHOLD = 4096  # bytes; larger serialized values are zlib-compressed
+
+
+def dumps(value):
+    """Serialize a JSON-compatible value (result lists, dicts, strings)"""
+    data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if len(data) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(data)
+    return b'j' + data
+
+
+def loads(data):
+    if data[:1] == b'z':
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class CacheError(Exception):
+    """Raised by a backend when the cache server can't be reached or rejects a command"""
+
+
+class MemoryBackend:
+    """Thread-safe LRU of serialized values with per-entry expiry.
+
+    Keys written by ``incr`` live in a separate table outside the LRU, so
+    a counter is never evicted and reset to zero by cache churn.
+    """
+
+    def __init__(self, max_entries=Config.CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode('ascii')
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._counters.pop(key, None)
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key)
+            if value is None:
+                entry = self._entries.pop(key, None)
+                value = int(entry[0]) if entry is not None else 0
+            self._counters[key] = value + 1
+            return value + 1
+
+
+class RESPBackend:
+    """Minimal client for a Redis-compatible server (GET/SET/DEL/INCR over RESP2).
+
+    Each thread keeps its own connection; connections are reopened after
+    a fork or a socket error. After a failed connect the server is skipped
+    for ``retry_interval`` seconds so an outage doesn't add a timeout to
+    every request.
+    """
+
+    def __init__(self, url, timeout=Config.CACHE_SOCKET_TIMEOUT, retry_interval=Config.CACHE_RETRY_INTERVAL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self._local = threading.local()
+
+    def get(self, key):
+        return self.execute('GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.execute('SET', key, value, 'PX', int(ttl * 1000))
+        else:
+            self.execute('SET', key, value)
+
+    def delete(self, key):
+        self.execute('DEL', key)
+
+    def incr(self, key):
+        return self.execute('INCR', key)
+
+    def execute(self, *args):
+        conn = self._connection()
+        try:
+            conn.sendall(encode_command(args))
+            return read_reply(self._local.reader)
+        except (OSError, ConnectionError) as e:
+            self._close()
+            raise CacheError(f'Cache server {self.host}:{self.port} unavailable: {e}') from e
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        if time.monotonic() < self._down_until:
+            raise CacheError(f'Cache server {self.host}:{self.port} marked down')
+        try:
+            conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            self._down_until = time.monotonic() + self.retry_interval
+            raise CacheError(f'Cache server {self.host}:{self.port} unavailable: {e}') from e
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.conn = conn
+        self._local.reader = conn.makefile('rb')
+        self._local.pid = os.getpid()
+
+        if self.password:
+            self.execute('AUTH', self.password)
+        if self.db:
+            self.execute('SELECT', self.db)
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+
+def encode_command(args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('connection closed')
+    kind, rest = line[:1], line[1:-2]
+
+    if kind == b'+':
+        return rest.decode('utf-8')
+    if kind == b'-':
+        raise CacheError(rest.decode('utf-8'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [read_reply(stream) for _ in range(count)]
+    raise CacheError(f'Unexpected reply {line!r}')
+
+
+class Namespace:
+    """Keys and statistics for one kind of cached data.
+
+    ``clear()`` bumps a generation number stored in the backend instead of
+    deleting keys, so it also retires the entries other processes wrote.
+    Backend errors are counted and treated as misses: a cache outage
+    slows requests down but never fails them.
+    """
+
+    def __init__(self, cache, name, default_ttl):
+        self.cache = cache
+        self.name = name
+        self.default_ttl = default_ttl
+        self.stats = defaultdict(int)
+
+        self._generation_value = 0
+        self._generation_checked = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _generation(self):
+        # Re-read at most every CACHE_GENERATION_TTL seconds; clears made by
+        # other processes become visible within that window
+        now = time.monotonic()
+        if self._generation_checked is None or now - self._generation_checked > Config.CACHE_GENERATION_TTL:
+            try:
+                value = self.cache.backend.get(self._generation_key())
+                self._generation_value = int(value) if value is not None else 0
+            except CacheError:
+                self.stats['errors'] += 1
+            self._generation_checked = now
+        return self._generation_value
+
+    def _generation_key(self):
+        return f'{self.cache.prefix}:{self.name}:generation'
+
+    def _key(self, key):
+        return f'{self.cache.prefix}:{self.name}:{self._generation()}:{key}'
+
+    def get(self, key, default=None):
+        try:
+            data = self.cache.backend.get(self._key(key))
+        except CacheError:
+            self.stats['errors'] += 1
+            data = None
+
+        if data is None:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        return loads(data)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.cache.backend.set(self._key(key), dumps(value), ttl or self.default_ttl)
+            self.stats['sets'] += 1
+        except CacheError:
+            self.stats['errors'] += 1
+
+    def delete(self, key):
+        try:
+            self.cache.backend.delete(self._key(key))
+        except CacheError:
+            self.stats['errors'] += 1
+
+    def incr(self, key):
+        """Atomically increment a counter key (not subject to ``clear()``)"""
+        try:
+            return self.cache.backend.incr(f'{self.cache.prefix}:{self.name}:counter:{key}')
+        except CacheError:
+            self.stats['errors'] += 1
+            return None
+
+    def counter(self, key):
+        try:
+            value = self.cache.backend.get(f'{self.cache.prefix}:{self.name}:counter:{key}')
+        except CacheError:
+            self.stats['errors'] += 1
+            return 0
+        return int(value) if value is not None else 0
+
+    def clear(self):
+        try:
+            self._generation_value = self.cache.backend.incr(self._generation_key())
+            self._generation_checked = time.monotonic()
+        except CacheError:
+            self.stats['errors'] += 1
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """Cached value for ``key``, computing and storing it on a miss.
+
+        Concurrent misses for the same key in this process share one
+        ``compute()`` call (single-flight). If it raises, the exception goes
+        to that caller only and each waiting caller computes on its own.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {'done': threading.Event(), 'value': missing}
+
+        if not leader:
+            self.stats['coalesced'] += 1
+            flight['done'].wait()
+            if flight['value'] is not missing:
+                return flight['value']
+            return compute()
+
+        try:
+            value = compute()
+            self.set(key, value, ttl)
+            flight['value'] = value
+            return value
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight['done'].set()
+
+
+class Cache:
+    """Entry point holding the backend and the namespaces created on it"""
+
+    def __init__(self, backend=None, prefix=Config.CACHE_PREFIX):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.prefix = prefix
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name, default_ttl=Config.CACHE_DEFAULT_TTL):
+        with self._lock:
+            if name not in self._namespaces:
+                self._namespaces[name] = Namespace(self, name, default_ttl)
+            return self._namespaces[name]
+
+    def stats(self):
+        return {name: dict(ns.stats) for name, ns in self._namespaces.items()}
+
+    def render_metrics(self):
+        """Per-namespace counters in Prometheus text format"""
+        lines = []
+        for stat in ('hits', 'misses', 'sets', 'coalesced', 'errors'):
+            metric = f'cinesense_cache_{stat}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for name, ns in sorted(self._namespaces.items()):
+                lines.append(f'{metric}{{namespace="{name}"}} {ns.stats[stat]}')
+        return '\n'.join(lines) + '\n'
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache configured from ``CACHE_URL``"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                url = Config.CACHE_URL
+                backend = RESPBackend(url) if url else MemoryBackend()
+                _cache = Cache(backend)
+    return _cache
+
+
+def serve(host='127.0.0.1', port=6379):
+    """Single-process Redis-protocol stand-in for development and tests"""
+    import asyncio
+
+    store = {}
+
+    def expired(key):
+        entry = store.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del store[key]
+            return True
+        return entry is None
+
+    def reply(value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, str):
+            return b'+' + value.encode('utf-8') + b'\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def run(args):
+        command = args[0].upper()
+        if command == b'PING':
+            return reply('PONG')
+        if command == b'GET':
+            return reply(None if expired(args[1]) else store[args[1]][0])
+        if command == b'SET':
+            key, value, options = args[1], args[2], [a.upper() for a in args[3:]]
+            expires = None
+            if b'NX' in options and not expired(key):
+                return reply(None)
+            if b'EX' in options:
+                expires = time.monotonic() + int(args[3 + options.index(b'EX') + 1])
+            if b'PX' in options:
+                expires = time.monotonic() + int(args[3 + options.index(b'PX') + 1]) / 1000
+            store[key] = (value, expires)
+            return reply('OK')
+        if command == b'DEL':
+            return reply(sum(1 for key in args[1:] if not expired(key) and store.pop(key, None)))
+        if command == b'INCR':
+            value = 0 if expired(args[1]) else int(store[args[1]][0])
+            store[args[1]] = (str(value + 1).encode('ascii'), store.get(args[1], (None, None))[1])
+            return reply(value + 1)
+        if command == b'DBSIZE':
+            return reply(sum(1 for key in list(store) if not expired(key)))
+        if command == b'FLUSHDB':
+            store.clear()
+            return reply('OK')
+        if command in (b'SELECT', b'AUTH'):
+            return reply('OK')
+        return b'-ERR unknown command\r\n'
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(run(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, host, port)
+        print(f"🗄️  Cache stand-in listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == 'serve':
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 6379
+        try:
+            serve(port=port)
+        except KeyboardInterrupt:
+            pass
+
+    elif command == 'ping':
+        if not Config.CACHE_URL:
+            print("ℹ️  CACHE_URL is not set; each process uses its in-memory cache")
+        else:
+            try:
+                print(f"✅ {RESPBackend(Config.CACHE_URL).execute('PING')}")
+            except CacheError as e:
+                print(f"❌ {e}")
+
+    else:
+        print(__doc__.strip())
@@ -2,9 +2,12 @@
 Cleanup Script - Remove movies without valid poster URLs from database
 """
 
-from app import app
+from db_context import create_db_app
 from models import db, Movie
 
+# Database-only app: no routes or ML components needed here
+app = create_db_app()
+
 def cleanup_movies_without_posters():
     """Remove all movies that don't have valid poster URLs"""
     
@@ -0,0 +1,251 @@
+"""
+Co-occurrence Index - Incrementally maintained "viewers also watched" lists
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+class CoOccurrenceIndex:
+    """Per-movie counts of the movies watched (or rated highly) by the same users.
+
+    Each user's last ``window`` movies are kept; a new event pairs the movie
+    with each of them, in both directions. Per movie only ``capacity``
+    counters are kept, maintained with the SpaceSaving heavy-hitter scheme:
+    an unseen movie arriving at a full list replaces the smallest counter
+    and inherits its count. Any movie co-watched more often than
+    ``total / capacity`` times is therefore guaranteed to be in the list.
+    The recent-movie windows are kept for the ``max_users`` most recently
+    active users. Memory is bounded by ``movies * capacity + max_users *
+    window`` whatever the history length. Like the trending counters, each
+    process keeps its own index. It is built once from a bounded slice of
+    history: in the pre-fork warm-up, whose index the workers inherit, or
+    in the background on first use. After that ``refresh`` merges only the
+    rows written since the last merge (by id, plus the last ``sync_lag``
+    seconds for late commits and re-rates) every ``sync_interval`` seconds,
+    so the index includes the events other workers handled without
+    replaying the whole history again.
+    """
+
+    def __init__(self, window=Config.CO_OCCURRENCE_WINDOW, capacity=Config.CO_OCCURRENCE_CAPACITY,
+                 max_users=Config.CO_OCCURRENCE_MAX_USERS,
+                 min_rating=Config.CO_OCCURRENCE_MIN_RATING,
+                 history_days=Config.CO_OCCURRENCE_HISTORY_DAYS,
+                 max_events=Config.CO_OCCURRENCE_MAX_EVENTS,
+                 sync_interval=Config.CO_OCCURRENCE_SYNC_INTERVAL,
+                 sync_lag=Config.CO_OCCURRENCE_SYNC_LAG):
+        self.window = window
+        self.capacity = capacity
+        self.max_users = max_users
+        self.min_rating = min_rating
+        self.history_days = history_days
+        self.max_events = max_events
+        self.sync_interval = sync_interval
+        self.sync_lag = timedelta(seconds=sync_lag)
+
+        self._recent = OrderedDict()  # user_id -> deque of recent movie ids, LRU order
+        self._counts = {}  # movie_id -> {co-watched movie_id: count}
+        self._pending = None  # events recorded while a load is running
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._synced_at = 0.0
+        # Database rows merged so far: newest watch and rating ids, and when they were read
+        self._last_watch_id = 0
+        self._last_rating_id = 0
+        self._checked_at = None
+        self.loaded = False
+
+    def record(self, user_id, movie_id, rating=None):
+        """Count one watch, or one rating (ignored below ``min_rating``)"""
+        self.record_many([(user_id, movie_id, rating)])
+
+    def record_many(self, events):
+        """Count a batch of ``(user_id, movie_id, rating)`` events (rating None for watches)"""
+        with self._lock:
+            for user_id, movie_id, rating in events:
+                self._record(user_id, movie_id, rating)
+                if self._pending is not None:
+                    self._pending.append((user_id, movie_id, rating))
+
+    def load_from_db(self):
+        """Build the lists by replaying recent watches and high ratings in time order.
+
+        The replay fills a fresh index without holding this one's lock, and
+        the result is swapped in at the end. Events recorded meanwhile are
+        then applied again. A movie already in the user's window adds no
+        pairs, so events the replay also saw are not counted twice.
+        """
+        from sqlalchemy import func
+        from models import db, Rating, WatchHistory
+
+        fresh = CoOccurrenceIndex(self.window, self.capacity, self.max_users, self.min_rating,
+                                  self.history_days, self.max_events)
+        with self._lock:
+            self._pending = []
+
+        try:
+            # Watermarks first: rows written during the replay are merged by the next sync
+            checked_at = datetime.now()
+            last_watch_id = db.session.query(func.max(WatchHistory.id)).scalar() or 0
+            last_rating_id = db.session.query(func.max(Rating.id)).scalar() or 0
+
+            watches = db.session.query(WatchHistory.watched_at, WatchHistory.user_id, WatchHistory.movie_id)\
+                .filter(WatchHistory.watched_at >= self._cutoff(WatchHistory.watched_at))\
+                .order_by(WatchHistory.watched_at)\
+                .yield_per(10000)
+            ratings = db.session.query(Rating.timestamp, Rating.user_id, Rating.movie_id, Rating.rating)\
+                .filter(Rating.timestamp >= self._cutoff(Rating.timestamp, Rating.rating >= self.min_rating),
+                        Rating.rating >= self.min_rating)\
+                .order_by(Rating.timestamp)\
+                .yield_per(10000)
+
+            # Both streams are time-ordered, so a k-way merge replays them in order
+            fresh.record_many(
+                (row[1], row[2], row[3] if len(row) > 3 else None)
+                for row in heapq.merge(watches, ratings, key=lambda row: row[0])
+            )
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._recent, self._counts = fresh._recent, fresh._counts
+            for event in self._pending:
+                self._record(*event)
+            self._pending = None
+            self._last_watch_id, self._last_rating_id = last_watch_id, last_rating_id
+            self._checked_at = checked_at
+
+        self._synced_at = time.monotonic()
+        self.loaded = True
+
+    def sync_from_db(self):
+        """Merge the watches and high ratings written since the last load or sync.
+
+        Rows are selected by id above the last merged one, plus those
+        timestamped within ``sync_lag`` of the last check (commits that
+        landed late, and re-rates, which keep their id). Rows merged twice
+        add no pairs while the movie is still in the user's window.
+        """
+        from sqlalchemy import func, or_
+        from models import db, Rating, WatchHistory
+
+        checked_at = datetime.now()
+        last_watch_id = db.session.query(func.max(WatchHistory.id)).scalar() or 0
+        last_rating_id = db.session.query(func.max(Rating.id)).scalar() or 0
+        since = self._checked_at - self.sync_lag
+
+        watches = db.session.query(WatchHistory.watched_at, WatchHistory.user_id, WatchHistory.movie_id)\
+            .filter(or_(WatchHistory.id > self._last_watch_id, WatchHistory.watched_at >= since),
+                    WatchHistory.id <= last_watch_id)\
+            .order_by(WatchHistory.watched_at)\
+            .all()
+        ratings = db.session.query(Rating.timestamp, Rating.user_id, Rating.movie_id, Rating.rating)\
+            .filter(or_(Rating.id > self._last_rating_id, Rating.timestamp >= since),
+                    Rating.id <= last_rating_id, Rating.rating >= self.min_rating)\
+            .order_by(Rating.timestamp)\
+            .all()
+
+        self.record_many(
+            (row[1], row[2], row[3] if len(row) > 3 else None)
+            for row in heapq.merge(watches, ratings, key=lambda row: row[0])
+        )
+        with self._lock:
+            self._last_watch_id, self._last_rating_id = last_watch_id, last_rating_id
+            self._checked_at = checked_at
+        self._synced_at = time.monotonic()
+        return len(watches) + len(ratings)
+
+    def ensure_loaded(self):
+        """Load on first use; concurrent first callers wait for a single load"""
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load_from_db()
+
+    def refresh(self):
+        """Load the index in the background on first use, then merge new rows every ``sync_interval`` seconds.
+
+        Never blocks: until the first load finishes ``top`` returns nothing.
+        """
+        from concurrency import submit_in_app_context
+
+        if self.loaded and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if not self._load_lock.acquire(blocking=False):
+            return  # a load or merge is already running
+
+        def update():
+            try:
+                if self.loaded:
+                    self.sync_from_db()
+                else:
+                    self.load_from_db()
+            finally:
+                self._load_lock.release()
+
+        try:
+            submit_in_app_context(update)
+        except Exception:
+            self._load_lock.release()
+            raise
+
+    def _cutoff(self, column, *criteria):
+        """Oldest replayed time: ``history_days`` back, or later when that holds over ``max_events`` events"""
+        from models import db
+
+        cutoff = datetime.now() - timedelta(days=self.history_days)
+        newest = db.session.query(column).filter(column >= cutoff, *criteria)\
+            .order_by(column.desc())\
+            .offset(self.max_events - 1)\
+            .limit(1)\
+            .scalar()
+        return max(cutoff, newest) if newest else cutoff
+
+    def top(self, movie_id, k):
+        """``[(movie_id, count), ...]`` most often co-watched with ``movie_id``"""
+        with self._lock:
+            counts = self._counts.get(movie_id)
+            if not counts:
+                return []
+            return heapq.nlargest(k, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def _record(self, user_id, movie_id, rating):
+        if rating is not None and rating < self.min_rating:
+            return
+
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = deque(maxlen=self.window)
+            if len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(user_id)
+
+        # A rewatch, or a rating after the watch, adds no new pairs
+        if movie_id in recent:
+            return
+
+        for other in recent:
+            self._bump(movie_id, other)
+            self._bump(other, movie_id)
+        recent.append(movie_id)
+
+    def _bump(self, movie_id, other):
+        counts = self._counts.get(movie_id)
+        if counts is None:
+            counts = self._counts[movie_id] = {}
+
+        if other in counts:
+            counts[other] += 1
+        elif len(counts) < self.capacity:
+            counts[other] = 1
+        else:
+            victim = min(counts, key=counts.get)
+            counts[other] = counts.pop(victim) + 1
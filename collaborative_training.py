@@ -0,0 +1,278 @@
+"""
+Collaborative Training - Out-of-core randomized SVD over ratings streamed from the database
+
+The ratings matrix A (users x items) is never materialized. Every pass
+reads the ratings table in id-ordered chunks and accumulates either
+``A @ basis`` or ``A.T @ basis``, so peak memory is one chunk plus a few
+(users or items) x (components + oversample) matrices. The factors follow
+Halko et al.'s randomized range finder with block power iterations: a
+random sketch, ``n_iter`` rounds of re-orthonormalized power iteration and
+a final small SVD. Each pass is checkpointed, so an interrupted fit
+resumes from the last finished pass, and the fitted factors are saved to
+disk and reloaded for as long as the ratings table is unchanged (same
+row count, max id, checksum of the values and latest timestamp, so
+re-rates in place count as changes).
+
+Usage (train ahead of time so servers start from the checkpoint):
+    python collaborative_training.py [chunk_size]
+"""
+
+import os
+
+import numpy as np
+
+from config import Config
+
+
+def ratings_snapshot():
+    """``(count, max_id, checksum, last_timestamp)`` of the ratings table.
+
+    A fit only reads ratings up to ``max_id``. The checksum (sum of
+    ``id * rating``) and the latest timestamp change when a rating is
+    updated in place, which leaves the count and max id as they were.
+    """
+    from sqlalchemy import func
+    from models import db, Rating
+
+    count, max_id, checksum, last_timestamp = db.session.query(
+        func.count(Rating.id), func.max(Rating.id),
+        func.total(Rating.id * Rating.rating), func.max(Rating.timestamp)
+    ).one()
+    return count, max_id or 0, float(checksum or 0.0), last_timestamp.timestamp() if last_timestamp else 0.0
+
+
+def rated_ids(column, max_id):
+    """Sorted distinct values of a ratings column, among ratings with id <= ``max_id``"""
+    from models import db, Rating
+
+    query = db.session.query(column).filter(Rating.id <= max_id).distinct().order_by(column)
+    return np.fromiter((value for (value,) in query), dtype=np.int64)
+
+
+def iter_rating_chunks(max_id, chunk_size=Config.COLLABORATIVE_CHUNK_SIZE):
+    """``(user_ids, movie_ids, ratings)`` arrays for up to ``chunk_size`` ratings at a time.
+
+    Keyset pagination on the primary key: each chunk is a short indexed
+    query, so no cursor stays open across a whole pass.
+    """
+    from models import db, Rating
+
+    last_id = 0
+    while last_id < max_id:
+        rows = db.session.query(Rating.id, Rating.user_id, Rating.movie_id, Rating.rating).filter(
+            Rating.id > last_id,
+            Rating.id <= max_id
+        ).order_by(Rating.id).limit(chunk_size).all()
+        if not rows:
+            return
+
+        ids, user_ids, movie_ids, values = (np.array(column) for column in zip(*rows))
+        last_id = int(ids[-1])
+        yield user_ids, movie_ids, values.astype(np.float32)
+
+
+def _chunk_matrix(user_ids, movie_ids, values, row_ids, col_ids):
+    """One chunk as a sparse matrix over ``row_ids`` x ``col_ids``, dropping unknown ids"""
+    from scipy import sparse
+
+    rows = np.searchsorted(row_ids, user_ids)
+    cols = np.searchsorted(col_ids, movie_ids)
+    known = (rows < len(row_ids)) & (cols < len(col_ids))
+    known[known] = (row_ids[rows[known]] == user_ids[known]) & (col_ids[cols[known]] == movie_ids[known])
+    return sparse.csr_matrix(
+        (values[known], (rows[known], cols[known])),
+        shape=(len(row_ids), len(col_ids))
+    )
+
+
+def ratings_matrix(user_ids, item_ids, max_id=None, chunk_size=Config.COLLABORATIVE_CHUNK_SIZE):
+    """Sparse ratings matrix over ``user_ids`` x ``item_ids``, assembled chunk by chunk.
+
+    Ratings by other users or for other items are skipped. Only the
+    compact COO arrays are kept between chunks, never the fetched rows.
+    """
+    from scipy import sparse
+
+    if max_id is None:
+        max_id = ratings_snapshot()[1]
+
+    blocks = [
+        _chunk_matrix(*chunk, user_ids, item_ids).tocoo()
+        for chunk in iter_rating_chunks(max_id, chunk_size)
+    ]
+    if not blocks:
+        return sparse.csr_matrix((len(user_ids), len(item_ids)), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate([b.data for b in blocks]),
+         (np.concatenate([b.row for b in blocks]), np.concatenate([b.col for b in blocks]))),
+        shape=(len(user_ids), len(item_ids))
+    )
+
+
+def _orthonormalize(matrix):
+    q, _ = np.linalg.qr(matrix)
+    return q
+
+
+def _save(path, **arrays):
+    # Write then rename, so a crash never leaves a truncated checkpoint behind
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class StreamingSVD:
+    """Truncated SVD of the ratings matrix fitted from streamed chunks.
+
+    After ``fit`` the attributes mirror sklearn's ``TruncatedSVD``:
+    ``components_`` (k x items) and ``singular_values_``, plus
+    ``user_factors_`` (users x k, i.e. ``U * S`` like ``fit_transform``)
+    and the sorted ``user_ids`` / ``item_ids`` labelling their rows.
+    """
+
+    def __init__(self, n_components=50, n_iter=Config.COLLABORATIVE_POWER_ITERATIONS,
+                 oversample=Config.COLLABORATIVE_OVERSAMPLE, chunk_size=Config.COLLABORATIVE_CHUNK_SIZE,
+                 random_state=Config.COLLABORATIVE_RANDOM_STATE,
+                 checkpoint_path=Config.COLLABORATIVE_CHECKPOINT_PATH):
+        self.n_components = n_components
+        self.n_iter = n_iter
+        self.oversample = oversample
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+        self.checkpoint_path = checkpoint_path
+
+        self.user_ids = None
+        self.item_ids = None
+        self.user_factors_ = None
+        self.components_ = None
+        self.singular_values_ = None
+        self.loaded_from_checkpoint = False
+
+    def fit(self, progress=None):
+        """Fit on the current ratings table; returns self, or None if there are no ratings.
+
+        ``progress(done_passes, total_passes)`` is called after every pass.
+        """
+        from models import Rating
+
+        count, max_id, checksum, last_timestamp = ratings_snapshot()
+        if not count:
+            return None
+
+        params = np.array([count, max_id, checksum, last_timestamp, self.n_components, self.n_iter,
+                           self.oversample, -1 if self.random_state is None else self.random_state],
+                          dtype=np.float64)
+        if self._load_factors(params):
+            return self
+
+        self.user_ids = rated_ids(Rating.user_id, max_id)
+        self.item_ids = rated_ids(Rating.movie_id, max_id)
+        n_users, n_items = len(self.user_ids), len(self.item_ids)
+        k = max(min(self.n_components, n_users - 1, n_items - 1), 1)
+        width = min(k + self.oversample, n_users, n_items)
+
+        # Passes alternate A @ basis (even) and A.T @ basis (odd); the last
+        # one yields B.T = A.T @ Q, whose small SVD finishes the fit
+        total = 2 * self.n_iter + 2
+        start, basis = self._load_partial(params)
+        if basis is None:
+            start = 0
+            rng = np.random.default_rng(self.random_state)
+            basis = rng.standard_normal((n_items, width)).astype(np.float32)
+
+        for step in range(start, total):
+            transpose = step % 2 == 1
+            product = np.zeros((n_items if transpose else n_users, width), dtype=np.float64)
+            for chunk in iter_rating_chunks(max_id, self.chunk_size):
+                block = _chunk_matrix(*chunk, self.user_ids, self.item_ids)
+                product += (block.T @ basis) if transpose else (block @ basis)
+
+            if progress:
+                progress(step + 1, total)
+            if step == total - 1:
+                break
+            basis = _orthonormalize(product)
+            self._save_partial(params, step + 1, basis)
+
+        # A ~= Q @ B with B = product.T = W S X.T  =>  U = Q @ X, V = W
+        w, s, xt = np.linalg.svd(product, full_matrices=False)
+        self.user_factors_ = (basis @ xt.T[:, :k]) * s[:k]
+        self.components_ = w[:, :k].T
+        self.singular_values_ = s[:k]
+
+        self._save_factors(params)
+        return self
+
+    @property
+    def _partial_path(self):
+        return self.checkpoint_path + '.partial.npz'
+
+    def _load_partial(self, params):
+        if not self.checkpoint_path:
+            return 0, None
+        state = _load(self._partial_path)
+        if state is None or not np.array_equal(state['params'], params):
+            return 0, None
+        return int(state['step']), state['basis']
+
+    def _save_partial(self, params, step, basis):
+        if self.checkpoint_path:
+            _save(self._partial_path, params=params, step=np.array(step), basis=basis)
+
+    def _load_factors(self, params):
+        if not self.checkpoint_path:
+            return False
+        state = _load(self.checkpoint_path)
+        if state is None or not np.array_equal(state['params'], params):
+            return False
+
+        self.user_ids = state['user_ids']
+        self.item_ids = state['item_ids']
+        self.user_factors_ = state['user_factors']
+        self.components_ = state['components']
+        self.singular_values_ = state['singular_values']
+        self.loaded_from_checkpoint = True
+        return True
+
+    def _save_factors(self, params):
+        if not self.checkpoint_path:
+            return
+        _save(
+            self.checkpoint_path, params=params,
+            user_ids=self.user_ids, item_ids=self.item_ids,
+            user_factors=self.user_factors_, components=self.components_,
+            singular_values=self.singular_values_
+        )
+        if os.path.exists(self._partial_path):
+            os.remove(self._partial_path)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from db_context import create_db_app
+    app = create_db_app()
+
+    chunk_size = int(sys.argv[1]) if len(sys.argv) > 1 else Config.COLLABORATIVE_CHUNK_SIZE
+
+    with app.app_context():
+        start = time.perf_counter()
+        model = StreamingSVD(chunk_size=chunk_size).fit(
+            progress=lambda done, total: print(f"⏳ Pass {done}/{total} ({time.perf_counter() - start:.1f}s)")
+        )
+        if model is None:
+            print("❌ No ratings in the database, nothing to train.")
+            sys.exit(1)
+
+        source = 'Loaded' if model.loaded_from_checkpoint else 'Trained'
+        print(f"✅ {source} {len(model.user_ids)} users x {len(model.item_ids)} items, "
+              f"{len(model.singular_values_)} factors → {model.checkpoint_path}")
@@ -0,0 +1,85 @@
+"""
+Concurrency - Run blocking database and model calls from async views
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+POOL_SIZES = {
+    'io': Config.ASYNC_IO_WORKERS,
+    'cpu': Config.ASYNC_CPU_WORKERS,
+    'sentiment': Config.ASYNC_SENTIMENT_WORKERS
+}
+
+
+def get_executor(kind='io'):
+    """Shared bounded thread pool for one kind of work (see ``POOL_SIZES``).
+
+    Pools are created lazily and per process, so a prefork worker never
+    reuses the (threadless) pool object it inherited from the master.
+    """
+    key = (kind, os.getpid())
+    executor = _executors.get(key)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=POOL_SIZES[kind], thread_name_prefix=f'async-{kind}')
+                _executors[key] = executor
+    return executor
+
+
+def _call_in_app_context(app, endpoint, fn, args, kwargs):
+    from flask import g
+
+    # A fresh app context gives the call its own scoped DB session
+    with app.app_context():
+        g.metrics_endpoint = endpoint
+        g.sql_queries = 0
+        result = fn(*args, **kwargs)
+        return result, g.sql_queries
+
+
+async def run_blocking(fn, *args, kind='io', **kwargs):
+    """Await ``fn(*args, **kwargs)`` run in a pool thread inside the current app's context"""
+    from flask import current_app, g, has_request_context, request
+
+    app = current_app._get_current_object()
+    endpoint = request.endpoint if has_request_context() else None
+
+    loop = asyncio.get_running_loop()
+    result, queries = await loop.run_in_executor(
+        get_executor(kind), _call_in_app_context, app, endpoint, fn, args, kwargs
+    )
+
+    # Attribute the offloaded queries to the request for /metrics
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + queries
+    return result
+
+
+def submit_in_app_context(fn, *args, kind='io', **kwargs):
+    """Run ``fn(*args, **kwargs)`` in a pool thread inside the current app's context without waiting"""
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    return get_executor(kind).submit(_call_in_app_context, app, None, fn, args, kwargs)
+
+
+async def with_fallback(awaitable, timeout, fallback):
+    """``(result, True)``, or ``(fallback(), False)`` if ``awaitable`` fails or exceeds ``timeout`` seconds.
+
+    A pool thread can't be interrupted, so a timed-out call still runs to
+    completion in the background; only the request stops waiting for it.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout), True
+    except Exception:
+        return fallback(), False
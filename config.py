@@ -18,6 +18,61 @@ class Config:
     COLLABORATIVE_WEIGHT = 0.6
     MIN_RATINGS_FOR_COLLABORATIVE = 5
     
+    # Content model: LSA embedding size (0 keeps the full TF-IDF similarity matrix)
+    CONTENT_EMBEDDING_DIM = 128
+    CONTENT_NEIGHBORS = int(os.environ.get('CONTENT_NEIGHBORS', 20))  # similar movies precomputed per movie (0 = score on demand)
+    CONTENT_NEIGHBOR_WORKERS = int(os.environ.get('CONTENT_NEIGHBOR_WORKERS', os.cpu_count() or 1))
+    CONTENT_SYNC_INTERVAL = 60  # seconds between checks for movies added by other processes
+    CONTENT_DRIFT_THRESHOLD = 0.15  # rise in unknown-token share that triggers a refit
+    CONTENT_DRIFT_SAMPLE = 1000  # movies used to measure the vocabulary baseline at fit time
+    CONTENT_REFIT_GROWTH = 0.2  # refit once incremental adds exceed this share of the fitted catalog
+    
+    # Out-of-core collaborative training (collaborative_training.py): ratings are
+    # streamed in chunks into a randomized SVD instead of loaded all at once
+    COLLABORATIVE_OUT_OF_CORE = os.environ.get('COLLABORATIVE_OUT_OF_CORE', '0') == '1'
+    COLLABORATIVE_CHUNK_SIZE = 100000  # ratings per query
+    COLLABORATIVE_POWER_ITERATIONS = 4  # more = closer to the exact SVD, one extra pair of passes each
+    COLLABORATIVE_OVERSAMPLE = 10
+    COLLABORATIVE_RANDOM_STATE = 0
+    COLLABORATIVE_CHECKPOINT_PATH = os.environ.get('COLLABORATIVE_CHECKPOINT_PATH', 'collaborative_factors.npz')
+    # New ratings trigger an out-of-core retrain in the background at most this often (seconds)
+    COLLABORATIVE_RETRAIN_INTERVAL = int(os.environ.get('COLLABORATIVE_RETRAIN_INTERVAL', 3600))
+    
+    # Columnar movie attributes for the cold-start, mood, time and seasonal lists (movie_features.py)
+    MOVIE_FEATURES_CHECK_INTERVAL = 30  # seconds between catalog version checks
+    
+    # Maximal-marginal-relevance re-ranking (diversity.py), per endpoint: the relevance weight,
+    # from 0 (only diversity) to 1 (unchanged order); endpoints not listed are not re-ranked
+    DIVERSITY_RELEVANCE_WEIGHTS = {
+        'get_recommendations': float(os.environ.get('DIVERSITY_RECOMMENDATIONS', 0.7)),
+        'mood_recommendations': float(os.environ.get('DIVERSITY_MOOD', 0.8)),
+    }
+    DIVERSITY_POOL = 100  # candidates fetched for re-ranking (the first pages stay stable)
+    
+    # Per-user bitmaps of watched/rated movies excluded from recommendations (seen_sets.py)
+    SEEN_SET_MAX_USERS = 100000  # most recently active users kept in memory
+    SEEN_SET_TTL = 60  # seconds before a user's set is reloaded (writes by other processes)
+    
+    # Per-user taste vectors for the content side of hybrid recommendations (taste_profiles.py)
+    TASTE_RATING_CENTER = 5.0  # ratings above pull a profile towards the movie, below push it away
+    TASTE_SYNC_INTERVAL = 30  # seconds between checks for ratings written by other processes
+    TASTE_SYNC_LAG = 60  # seconds re-read for re-rates committed after their timestamp (buffered writes)
+    
+    # Implicit-feedback ALS over watch history (implicit_als.py)
+    IMPLICIT_ENABLED = os.environ.get('IMPLICIT_ENABLED', '1') == '1'
+    IMPLICIT_WEIGHT = 0.5  # implicit scores are preferences in roughly [0, 1]
+    MIN_WATCHES_FOR_IMPLICIT = 5  # distinct movies watched before a user gets implicit recommendations
+    IMPLICIT_FACTORS = 64
+    IMPLICIT_REGULARIZATION = 0.01
+    IMPLICIT_ALPHA = 40.0  # confidence = 1 + alpha * watch count
+    IMPLICIT_ITERATIONS = 15
+    IMPLICIT_CG_STEPS = 3  # conjugate-gradient steps per row and half-sweep
+    IMPLICIT_WORKERS = int(os.environ.get('IMPLICIT_WORKERS', os.cpu_count() or 1))
+    
+    # Approximate nearest-neighbor search over item factors
+    ANN_N_PROBE = 8  # clusters scanned per query; higher = better recall, slower
+    ANN_MIN_ITEMS = 1000  # below this the index scans everything (exact search)
+    
     # Pagination
     MOVIES_PER_PAGE = 20
     RECOMMENDATIONS_LIMIT = 20
@@ -26,6 +81,76 @@ class Config:
     # Trending settings
     TRENDING_DAYS_DEFAULT = 7
     TRENDING_LIMIT = 20
+    TRENDING_HOURLY_RETENTION_HOURS = 48
+    TRENDING_DAILY_RETENTION_DAYS = 90
+    TRENDING_HALF_LIFE_HOURS = 24.0
+    TRENDING_TOP_K = 200
+    TRENDING_CACHE_SECONDS = 60
+    TRENDING_RELOAD_INTERVAL = 300  # seconds between re-merges with the database (events of other workers)
+    
+    # "Viewers also watched" co-occurrence index (co_occurrence.py)
+    CO_OCCURRENCE_WINDOW = 20  # recent movies per user that a new event is paired with
+    CO_OCCURRENCE_CAPACITY = 50  # heavy-hitter counters kept per movie
+    CO_OCCURRENCE_MAX_USERS = 100000  # users whose recent movies are tracked
+    CO_OCCURRENCE_MIN_RATING = 7.0  # ratings below this (out of 10) are not counted
+    CO_OCCURRENCE_HISTORY_DAYS = 365  # history replayed when the index is loaded
+    CO_OCCURRENCE_MAX_EVENTS = 200000  # at most this many of the newest watches (and ratings) replayed
+    CO_OCCURRENCE_SYNC_INTERVAL = 60  # seconds between merges of new database rows (events of other workers)
+    CO_OCCURRENCE_SYNC_LAG = 60  # seconds re-read for rows committed after their timestamp (buffered writes)
+    
+    # Offline precomputed recommendations
+    RECOMMENDATION_MODEL_VERSION = os.environ.get('RECOMMENDATION_MODEL_VERSION', '1')
+    PRECOMPUTED_LIMIT = 50  # recommendations stored per user
+    PRECOMPUTED_MAX_AGE_HOURS = 24
+    
+    # Instrumentation: opt-in sampling profiler behind /metrics/profile
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    
+    # Write-behind event buffer (watch history / ratings)
+    EVENT_BUFFER_ENABLED = os.environ.get('EVENT_BUFFER_ENABLED', '1') == '1'
+    EVENT_BUFFER_MAX_BATCH = 500
+    EVENT_BUFFER_FLUSH_INTERVAL = 1.0  # seconds
+    EVENT_BUFFER_MAX_QUEUE = 10000
+    EVENT_BUFFER_PUT_TIMEOUT = 0.5  # seconds a request may block when the queue is full
+    EVENT_BUFFER_MAX_RETRIES = 3  # failed writes of an event before it is dropped
+    EVENT_BUFFER_RATINGS = os.environ.get('EVENT_BUFFER_RATINGS', '0') == '1'
+    
+    # Prefork server (serve.py)
+    SERVER_HOST = os.environ.get('HOST', '0.0.0.0')
+    SERVER_PORT = int(os.environ.get('PORT', '5000'))
+    SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+    
+    # Thread pools behind async views (per process)
+    ASYNC_IO_WORKERS = 16  # concurrent DB queries
+    ASYNC_CPU_WORKERS = os.cpu_count() or 1  # NumPy scoring releases the GIL
+    ASYNC_SENTIMENT_WORKERS = 4  # separate pool so slow review analysis can't starve queries
+    
+    # Movie detail page: per-component timeouts (seconds) before degrading
+    DETAIL_SENTIMENT_TIMEOUT = 0.5
+    DETAIL_SIMILAR_TIMEOUT = 1.0
+    SENTIMENT_CACHE_TTL = 24 * 3600  # seconds the last review summary per movie is kept
+    
+    # Server-side response cache + ETags for read endpoints (max-age in seconds)
+    HTTP_CACHE_VERSION_TTL = 5  # seconds between catalog/model version checks
+    HTTP_CACHE_TRENDING_MAX_AGE = 60
+    HTTP_CACHE_SEARCH_MAX_AGE = 300
+    HTTP_CACHE_MOVIE_MAX_AGE = 300
+    HTTP_CACHE_MOOD_MAX_AGE = 120
+    
+    # API list responses
+    API_MAX_PAGE_SIZE = 100
+    API_MAX_OFFSET = int(os.environ.get('API_MAX_OFFSET', 500))  # deepest cursor a list will page to
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent uncompressed
+    COMPRESS_LEVEL = 6
+    
+    # Shared cache (cache.py): redis://host:port/db, or unset for a per-process LRU
+    CACHE_URL = os.environ.get('CACHE_URL', '')
+    CACHE_PREFIX = 'cinesense'
+    CACHE_MAX_ENTRIES = 10000
+    CACHE_DEFAULT_TTL = 300  # seconds
+    CACHE_GENERATION_TTL = 1.0  # seconds a namespace generation is trusted locally
+    CACHE_SOCKET_TIMEOUT = 0.25  # seconds
+    CACHE_RETRY_INTERVAL = 5.0  # seconds to skip the server after a failed connect
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,180 @@
+"""
+Content Neighbors - Blockwise, multi-process top-k content neighbor search
+
+Each block of rows is scored against the whole catalog and reduced to its
+top-k neighbors, sorted by (score desc, movie row asc). Blocks are the
+same whatever the worker count, so the result is bit-identical for one
+worker or many. Lists can later be patched in place when a few movies
+are added or edited, instead of being rebuilt.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Keep each worker process to one BLAS thread; parallelism comes from the pool
+_BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def top_k_block(source, start, stop, k, similarity=False):
+    """Top-k neighbor rows and scores for rows ``start:stop`` of the catalog.
+
+    ``source`` is either the L2-normalized embedding matrix (scores are dot
+    products) or, with ``similarity=True``, a precomputed N x N matrix.
+    """
+    if similarity:
+        scores = np.array(source[start:stop], dtype=np.float32)
+    else:
+        scores = np.asarray(source[start:stop] @ source.T, dtype=np.float32)
+    return _select_top_k(scores, np.arange(start, stop), k)
+
+
+def top_k_rows(source, rows, k):
+    """``top_k_block`` for an arbitrary set of embedding rows"""
+    scores = np.asarray(source[rows] @ source.T, dtype=np.float32)
+    return _select_top_k(scores, rows, k)
+
+
+def _select_top_k(scores, rows, k):
+    scores[np.arange(len(rows)), rows] = -np.inf
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    return _sort_lists(top, top_scores)
+
+
+def _sort_lists(indices, values, k=None):
+    # Ties broken by movie row so the order never depends on argpartition
+    order = np.lexsort((indices, -values), axis=1)[:, :k]
+    return (
+        np.take_along_axis(indices, order, axis=1).astype(np.int32),
+        np.take_along_axis(values, order, axis=1).astype(np.float32)
+    )
+
+
+def patch_neighbor_lists(indices, values, source, changed_rows, block_size=1024):
+    """Update top-k lists after ``changed_rows`` of ``source`` were added or re-embedded.
+
+    Rows beyond ``len(indices)`` are new. Changed rows, and rows whose list
+    referenced a changed row, get their list recomputed; every other row
+    only merges the changed rows into its existing list, which gives the
+    same top-k as a full rebuild.
+    """
+    n = source.shape[0]
+    old_n, k = indices.shape
+    changed = np.unique(np.asarray(changed_rows, dtype=np.int64))
+
+    if n > old_n:
+        indices = np.vstack([indices, np.zeros((n - old_n, k), dtype=np.int32)])
+        values = np.vstack([values, np.zeros((n - old_n, k), dtype=np.float32)])
+    else:
+        indices, values = indices.copy(), values.copy()
+
+    stale = np.zeros(n, dtype=bool)
+    stale[changed] = True
+    stale[:old_n] |= np.isin(indices[:old_n], changed).any(axis=1)
+
+    recompute = np.flatnonzero(stale)
+    for i in range(0, len(recompute), block_size):
+        rows = recompute[i:i + block_size]
+        indices[rows], values[rows] = top_k_rows(source, rows, k)
+
+    if len(changed):
+        changed_vectors = source[changed]
+        rest = np.flatnonzero(~stale)
+        for i in range(0, len(rest), block_size):
+            rows = rest[i:i + block_size]
+            candidate_scores = np.asarray(source[rows] @ changed_vectors.T, dtype=np.float32)
+            merged_indices = np.hstack([indices[rows], np.broadcast_to(changed, candidate_scores.shape)])
+            merged_values = np.hstack([values[rows], candidate_scores])
+            indices[rows], values[rows] = _sort_lists(merged_indices, merged_values, k)
+
+    return indices, values
+
+
+def _run_block(source_path, output_path, start, stop, k, similarity):
+    source = np.load(source_path, mmap_mode='r')
+    indices = np.load(output_path + '.indices.npy', mmap_mode='r+')
+    values = np.load(output_path + '.values.npy', mmap_mode='r+')
+
+    indices[start:stop], values[start:stop] = top_k_block(source, start, stop, k, similarity)
+    indices.flush()
+    values.flush()
+    return start, stop
+
+
+def build_neighbor_lists(source, k, block_size=1024, workers=1, similarity=False, progress=None):
+    """``(indices, values)``, both N x k, holding each row's top-k neighbors.
+
+    With ``workers > 1`` the source is written to a memory-mapped file and
+    blocks are computed by a process pool that writes straight into
+    memory-mapped outputs. ``progress(done_rows, total_rows)`` is called
+    as blocks finish.
+    """
+    n = source.shape[0]
+    blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+    if workers <= 1 or len(blocks) <= 1:
+        indices = np.empty((n, k), dtype=np.int32)
+        values = np.empty((n, k), dtype=np.float32)
+        done = 0
+        for start, stop in blocks:
+            indices[start:stop], values[start:stop] = top_k_block(source, start, stop, k, similarity)
+            done += stop - start
+            if progress:
+                progress(done, n)
+        return indices, values
+
+    with tempfile.TemporaryDirectory(prefix='content-neighbors-') as tmp:
+        source_path = os.path.join(tmp, 'source.npy')
+        output_path = os.path.join(tmp, 'neighbors')
+        np.save(source_path, np.ascontiguousarray(source, dtype=np.float32))
+        np.lib.format.open_memmap(output_path + '.indices.npy', mode='w+', dtype=np.int32, shape=(n, k))
+        np.lib.format.open_memmap(output_path + '.values.npy', mode='w+', dtype=np.float32, shape=(n, k))
+
+        # Spawned (not forked) workers: the app may have threads holding locks
+        import multiprocessing
+        saved = {var: os.environ.get(var) for var in _BLAS_THREAD_VARS}
+        os.environ.update({var: '1' for var in _BLAS_THREAD_VARS})
+        try:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(_run_block, source_path, output_path, start, stop, k, similarity)
+                    for start, stop in blocks
+                ]
+                done = 0
+                for future in as_completed(futures):
+                    start, stop = future.result()
+                    done += stop - start
+                    if progress:
+                        progress(done, n)
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+        indices = np.array(np.load(output_path + '.indices.npy'))
+        values = np.array(np.load(output_path + '.values.npy'))
+
+    return indices, values
+
+
+def print_progress(label='Content neighbors'):
+    """Progress callback printing rows done, rate and ETA"""
+    import sys
+    started = time.perf_counter()
+
+    def report(done, total):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        print(f"\r⏳ {label}: {done}/{total} rows ({rate:,.0f}/s, ETA {eta:.0f}s)",
+              end='\n' if done == total else '', file=sys.stderr, flush=True)
+
+    return report
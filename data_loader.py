@@ -5,8 +5,12 @@ Data Loader - Loads sample movie data into the database
 from datetime import datetime, date
 from models import db, Movie
 
-def load_sample_data():
-    """Load sample movie data into the database"""
+def load_sample_data(engine=None):
+    """Load sample movie data into the database
+    
+    Pass the running ``RecommendationEngine`` to add new movies to its
+    content index right away instead of on its next catalog sync.
+    """
     
     sample_movies = [
         {
@@ -163,12 +167,14 @@ def load_sample_data():
     
     print("📊 Loading sample movie data...")
     
+    added = []
     for movie_data in sample_movies:
         # Check if movie already exists
         existing = Movie.query.filter_by(title=movie_data['title']).first()
         if not existing:
             movie = Movie(**movie_data)
             db.session.add(movie)
+            added.append(movie)
             print(f"✅ Added: {movie_data['title']}")
         else:
             print(f"⏭️  Skipped (exists): {movie_data['title']}")
@@ -176,11 +182,15 @@ def load_sample_data():
     db.session.commit()
     print(f"\n🎉 Sample data loaded successfully!")
     
+    if engine is not None and added:
+        engine.update_content_items([movie.id for movie in added])
+    
     return len(sample_movies)
 
 
 if __name__ == '__main__':
-    from app import app
+    from db_context import create_db_app
+    app = create_db_app()
     
     with app.app_context():
         load_sample_data()
@@ -0,0 +1,28 @@
+"""
+DB Context - Lightweight database-only Flask app for maintenance scripts
+
+Importing ``app`` registers every route and instrumentation hook; scripts
+that only read or fix rows can use this instead and skip all of that.
+"""
+
+import os
+
+from flask import Flask
+
+DEFAULT_DATABASE_URI = 'sqlite:///cinesense.db'
+
+
+def configure_db(app):
+    """Point ``app`` at the application database and bind the shared ``db``"""
+    from models import db
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def create_db_app():
+    """Minimal app with only the database configured"""
+    # Lives next to app.py, so relative SQLite paths resolve to the same instance folder
+    return configure_db(Flask(__name__))
@@ -0,0 +1,49 @@
+"""
+Diversity - Maximal-marginal-relevance re-ranking of recommendation lists
+
+MMR (Carbonell & Goldstein) builds the list greedily: each step takes the
+candidate maximizing ``w * relevance - (1 - w) * max similarity to the
+items already taken``. The max-similarity column is kept for all
+candidates and updated with one matrix-vector product per pick, so
+re-ranking n candidates into k results costs O(k * n * d) in NumPy and no
+per-pair lookups. Picks depend only on the earlier ones, so the first m
+results are the same whatever ``k`` is, and pages stay consistent.
+"""
+
+import numpy as np
+
+
+def mmr(vectors, k, relevance_weight, relevance=None):
+    """Indices of ``k`` candidates in MMR order.
+
+    ``vectors`` are the candidates' unit-norm embeddings (zero rows for
+    candidates without one, which are never penalized). ``relevance``
+    defaults to the current order (linearly decreasing) and is rescaled
+    to [0, 1]. ``relevance_weight`` 1 keeps the relevance order and lower
+    values trade relevance for diversity.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    if relevance is None:
+        relevance = np.linspace(1.0, 0.0, n, dtype=np.float32)
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        span = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+
+    gain = relevance_weight * relevance
+    max_similarity = np.zeros(n, dtype=np.float32)
+    taken = np.zeros(n, dtype=bool)
+    order = []
+    for _ in range(k):
+        score = gain - (1 - relevance_weight) * max_similarity
+        score[taken] = -np.inf
+        best = int(np.argmax(score))
+        order.append(best)
+        taken[best] = True
+        np.maximum(max_similarity, vectors @ vectors[best], out=max_similarity)
+    return order
@@ -0,0 +1,275 @@
+"""
+Event Buffer - Write-behind batching for watch history and rating events
+"""
+
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class BufferFull(Exception):
+    """Raised when the event queue stays full longer than the put timeout"""
+
+
+class EventBuffer:
+    """Collect high-volume user events in memory and flush them in one transaction.
+
+    Events are queued by the request thread and written by a background
+    thread whenever ``max_batch`` events are pending or ``flush_interval``
+    seconds have passed since the first pending event, so SQLite pays one
+    fsync per batch instead of one per event. The queue is bounded: when it
+    is full, producers block for up to ``put_timeout`` seconds and then get
+    ``BufferFull`` so the endpoint can shed load.
+
+    A batch whose transaction fails is rolled back and its events are
+    queued again; an event is dropped (and counted) after ``max_retries``
+    failed writes or when the queue has no room for it.
+    """
+
+    def __init__(self, app, max_batch=500, flush_interval=1.0, max_queue=10000,
+                 put_timeout=0.5, max_retries=3, buffer_ratings=False):
+        self.app = app
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.buffer_ratings = buffer_ratings
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # stats are updated by request threads and the flusher
+        self._thread = None
+        self._listeners = []
+        self._atexit_registered = False
+
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'rejected': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0
+        }
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='event-buffer-flush',
+            daemon=True
+        )
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def stop(self, timeout=5.0):
+        """Stop the flush thread and write everything still queued"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def add_listener(self, callback):
+        """Register ``callback(kind, events)`` to run after each committed batch"""
+        self._listeners.append(callback)
+
+    def add_watch(self, user_id, movie_id, watched_at=None):
+        """Queue a watch-history event"""
+        self._put({
+            'kind': 'watch',
+            'user_id': user_id,
+            'movie_id': movie_id,
+            'watched_at': watched_at or datetime.now()
+        })
+
+    def add_rating(self, user_id, movie_id, rating, timestamp=None):
+        """Queue a rating event (later ratings for the same movie win)"""
+        self._put({
+            'kind': 'rating',
+            'user_id': user_id,
+            'movie_id': movie_id,
+            'rating': rating,
+            'timestamp': timestamp or datetime.now()
+        })
+
+    def pending(self):
+        """Number of events waiting to be written"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Synchronously write all queued events (failed ones are retried until dropped)"""
+        while True:
+            batch = self._drain(self.max_batch)
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    def render_metrics(self):
+        """Event counters in Prometheus text format"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lines = []
+        for stat in ('queued', 'written', 'batches', 'rejected', 'failed', 'retried', 'dropped'):
+            metric = f'cinesense_event_buffer_{stat}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {stats[stat]}')
+        lines.append('# TYPE cinesense_event_buffer_pending gauge')
+        lines.append(f'cinesense_event_buffer_pending {self.pending()}')
+        return '\n'.join(lines) + '\n'
+
+    def _put(self, event):
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            self._count(rejected=1)
+            raise BufferFull('Event buffer is full, retry later')
+        self._count(queued=1)
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for stat, amount in increments.items():
+                self.stats[stat] += amount
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if not self._write_batch(batch):
+                # Back off before retrying the requeued events
+                self._stop_event.wait(self.flush_interval)
+
+    def _write_batch(self, batch):
+        """Write one batch of events in a single transaction; False if it failed"""
+        from models import db
+
+        watches = [e for e in batch if e['kind'] == 'watch']
+        ratings = [e for e in batch if e['kind'] == 'rating']
+
+        with self._write_lock, self.app.app_context():
+            try:
+                if watches:
+                    self._insert_watches(watches)
+                if ratings:
+                    self._upsert_ratings(ratings)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._count(failed=len(batch))
+                print(f"❌ Event buffer flush failed ({len(batch)} events): {e}")
+                self._requeue(batch)
+                return False
+
+            self._count(written=len(batch), batches=1)
+
+            # Each call on its own, so a failing watch update can't skip the rating one
+            for kind, events in (('watch', watches), ('rating', ratings)):
+                if not events:
+                    continue
+                for callback in self._listeners:
+                    try:
+                        callback(kind, events)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"⚠️  Event buffer listener failed ({kind}, {len(events)} events): {e}")
+        return True
+
+    def _requeue(self, batch):
+        """Queue the events of a failed batch again, dropping those out of retries"""
+        retried = dropped = 0
+        for event in batch:
+            event['attempts'] = event.get('attempts', 0) + 1
+            if event['attempts'] >= self.max_retries:
+                dropped += 1
+                continue
+            try:
+                self._queue.put_nowait(event)
+                retried += 1
+            except queue.Full:
+                dropped += 1
+        self._count(retried=retried, dropped=dropped)
+        if dropped:
+            print(f"❌ Event buffer dropped {dropped} events")
+
+    def _insert_watches(self, events):
+        from models import db, WatchHistory
+
+        db.session.execute(
+            WatchHistory.__table__.insert(),
+            [{
+                'user_id': e['user_id'],
+                'movie_id': e['movie_id'],
+                'watched_at': e['watched_at']
+            } for e in events]
+        )
+
+    def _upsert_ratings(self, events):
+        from models import db, Rating
+
+        # Collapse repeated ratings for the same (user, movie) pair
+        latest = {}
+        for event in events:
+            latest[(event['user_id'], event['movie_id'])] = event
+
+        user_ids = {user_id for user_id, _ in latest}
+        movie_ids = {movie_id for _, movie_id in latest}
+
+        existing = {
+            (rating.user_id, rating.movie_id): rating
+            for rating in Rating.query.filter(
+                Rating.user_id.in_(user_ids),
+                Rating.movie_id.in_(movie_ids)
+            ).all()
+        }
+
+        new_rows = []
+        for key, event in latest.items():
+            rating = existing.get(key)
+            if rating:
+                if rating.timestamp and rating.timestamp > event['timestamp']:
+                    continue  # a retried event older than the stored rating
+                rating.rating = event['rating']
+                rating.timestamp = event['timestamp']
+            else:
+                new_rows.append({
+                    'user_id': event['user_id'],
+                    'movie_id': event['movie_id'],
+                    'rating': event['rating'],
+                    'timestamp': event['timestamp']
+                })
+
+        if new_rows:
+            db.session.execute(Rating.__table__.insert(), new_rows)
@@ -3,9 +3,12 @@ Fix Poster Loading Issues
 Ensures all TMDB poster URLs are properly formatted and accessible
 """
 
-from app import app
+from db_context import create_db_app
 from models import db, Movie
 
+# Database-only app: no routes or ML components needed here
+app = create_db_app()
+
 def fix_tmdb_poster_urls():
     """Ensure all TMDB poster URLs use HTTPS and proper size"""
     
@@ -0,0 +1,151 @@
+"""
+HTTP Cache - Shared response cache with ETag revalidation for read endpoints
+"""
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from config import Config
+
+
+def catalog_fingerprint():
+    """Cheap aggregate over the movies table that changes when the catalog does"""
+    from sqlalchemy import func
+    from models import db, Movie
+
+    row = db.session.query(
+        func.count(Movie.id),
+        func.max(Movie.id),
+        func.total(func.length(Movie.poster_url)),
+        func.total(Movie.popularity),
+        func.total(Movie.avg_rating),
+        func.total(Movie.vote_count)
+    ).one()
+    return tuple(row)
+
+
+class _Uncacheable(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ResponseCache:
+    """Cache of rendered JSON responses keyed by route, normalized args and data version.
+
+    Entries live in the ``http`` namespace of the shared cache, so with a
+    networked backend every worker process serves the others' entries.
+    The version combines every registered source (catalog fingerprint,
+    model versions, ...) and is recomputed at most every ``version_ttl``
+    seconds, so a catalog or model change retires all older entries at
+    once. ETags are a hash of the body, so they agree across processes and
+    a client's ``If-None-Match`` gets a 304 from any of them.
+    """
+
+    def __init__(self, cache=None, version_ttl=Config.HTTP_CACHE_VERSION_TTL):
+        from cache import get_cache
+
+        self.store = (cache or get_cache()).namespace('http')
+        self.version_ttl = version_ttl
+
+        self._version_sources = []
+        self._version = None
+        self._version_checked = 0.0
+
+    @property
+    def stats(self):
+        return self.store.stats
+
+    def add_version_source(self, fn):
+        """Register ``fn()`` whose (JSON-serializable) result is part of every cache key"""
+        self._version_sources.append(fn)
+        self._version = None
+
+    def version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_ttl:
+            self._version = [fn() for fn in self._version_sources]
+            self._version_checked = now
+        return self._version
+
+    def clear(self):
+        self.store.clear()
+
+    def invalidate_user(self, user_id):
+        """Retire per-user entries (e.g. after the user's preferences change)"""
+        self.store.incr(f'user:{user_id}')
+
+    def cached(self, max_age, private=False, vary_user=False, include_body=False):
+        """Decorator caching a view's 200 responses for ``max_age`` seconds.
+
+        ``vary_user`` keys entries by the session user (and marks the
+        responses to logged-in users private); ``include_body`` adds the normalized JSON body to the key
+        for POST endpoints. A view can set ``g.skip_response_cache`` to keep
+        a partial response out of the cache. Concurrent misses for the same
+        key render the view once.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                from flask import current_app, g, make_response, session
+
+                user = None
+                personal = private
+                if vary_user:
+                    user_id = session.get('user_id')
+                    user = [user_id, self.store.counter(f'user:{user_id}')]
+                    personal = personal or user_id is not None
+                key_data = [self._request_key(include_body), user, self.version()]
+                key = hashlib.sha1(json.dumps(key_data, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+                def render():
+                    response = make_response(current_app.ensure_sync(view)(*args, **kwargs))
+                    if response.status_code != 200 or g.pop('skip_response_cache', False):
+                        raise _Uncacheable(response)
+
+                    body = response.get_data()
+                    return {
+                        'body': body.decode('utf-8'),
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha1(body).hexdigest()
+                    }
+
+                try:
+                    entry = self.store.get_or_compute(key, render, ttl=max_age)
+                except _Uncacheable as e:
+                    self.store.stats['uncacheable'] += 1
+                    return e.response
+
+                return self._respond(entry, max_age, personal, vary_user)
+            return wrapper
+        return decorator
+
+    def _request_key(self, include_body):
+        from flask import request
+
+        args = sorted(
+            [name, sorted(value.strip() for value in values)]
+            for name, values in request.args.lists()
+        )
+        body = request.get_json(silent=True) if include_body else None
+        return [request.endpoint, sorted(request.view_args.items()), args,
+                json.dumps(body, sort_keys=True) if body is not None else None]
+
+    def _respond(self, entry, max_age, private, vary_user):
+        from flask import Response, request
+
+        response = Response(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        if private:
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if vary_user:
+            response.vary.add('Cookie')
+
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self.store.stats['not_modified'] += 1
+        return response
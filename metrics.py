@@ -0,0 +1,229 @@
+"""
+Metrics - Request latency, stage timings and SQL statistics in Prometheus text format
+"""
+
+import inspect
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{labels} {series["count"]}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return '\n'.join(lines)
+
+
+class MetricsRegistry:
+    """Holds every metric of this process"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'cinesense_request_duration_seconds', 'HTTP request latency by endpoint',
+    ('endpoint', 'method', 'status')
+)
+REQUEST_SQL_QUERIES = REGISTRY.histogram(
+    'cinesense_request_sql_queries', 'SQL statements executed per HTTP request',
+    ('endpoint',), COUNT_BUCKETS
+)
+SQL_LATENCY = REGISTRY.histogram(
+    'cinesense_sql_query_duration_seconds', 'SQL statement latency by endpoint',
+    ('endpoint',)
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    'cinesense_stage_duration_seconds', 'Time spent in engine, analyzer and serialization stages',
+    ('stage',)
+)
+
+
+class timed:
+    """Record a stage duration; use as ``@timed('stage')`` or ``with timed('stage'):``"""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_LATENCY.observe(time.perf_counter() - self._start, stage=self.stage)
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class SamplingProfiler:
+    """Periodically samples every thread's stack into folded flame-graph lines"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()  # guards samples between the sampler and readers
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            self.samples.clear()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self):
+        """Samples as ``frame;frame;frame count`` lines (flamegraph.pl / speedscope input)"""
+        with self._lock:
+            samples = self.samples.copy()
+        return '\n'.join(f'{stack} {count}' for stack, count in samples.most_common()) + '\n'
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self.samples.update(stacks)
+
+
+profiler = SamplingProfiler()
+
+
+def instrument_app(app):
+    """Hook request latency, per-request SQL counts and JSON serialization timing into ``app``"""
+    from flask import g, request, has_app_context, has_request_context
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # Wrap whichever JSON provider the app has configured
+    class TimedJSONProvider(type(app.json)):
+        def dumps(self, obj, **kwargs):
+            with timed('serialize.json'):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.sql_queries = 0
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.endpoint or 'unknown'
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                endpoint=endpoint, method=request.method, status=response.status_code
+            )
+            REQUEST_SQL_QUERIES.observe(g.pop('sql_queries', 0), endpoint=endpoint)
+        return response
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context():
+            endpoint = request.endpoint or 'unknown'
+            g.sql_queries = g.get('sql_queries', 0) + 1
+        elif has_app_context() and g.get('metrics_endpoint'):
+            # Offloaded from an async view by concurrency.run_blocking
+            endpoint = g.metrics_endpoint
+            g.sql_queries += 1
+        else:
+            endpoint = 'background'
+        SQL_LATENCY.observe(elapsed, endpoint=endpoint)
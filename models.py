@@ -139,3 +139,17 @@ class UserPreference(db.Model):
             'favorite_directors': self.favorite_directors.split(',') if self.favorite_directors else [],
             'preferred_languages': self.preferred_languages.split(',') if self.preferred_languages else []
         }
+
+class PrecomputedRecommendation(db.Model):
+    __tablename__ = 'precomputed_recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    model_version = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list
+    computed_at = db.Column(db.DateTime, default=datetime.now)
+
+class RecommendationInvalidation(db.Model):
+    __tablename__ = 'recommendation_invalidations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    invalidated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)  # lists computed before are stale
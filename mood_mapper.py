@@ -1,7 +1,15 @@
 from datetime import datetime
 
+from metrics import timed
+from movie_features import MovieFeatureStore
+
 class MoodMapper:
-    def __init__(self):
+    def __init__(self, seen=None, features=None):
+        # SeenSets shared with the recommendation engine; movies the user has
+        # watched or rated are left out when given
+        self.seen = seen
+        self.features = features or MovieFeatureStore()
+        
         self.mood_genre_mapping = {
             'happy': {
                 'genres': ['Comedy', 'Animation', 'Family', 'Musical'],
@@ -73,9 +81,10 @@ class MoodMapper:
             'afternoon': ['Drama', 'Romance', 'Documentary']
         }
     
+    @timed('mood.get_mood_based_recommendations')
     def get_mood_based_recommendations(self, mood, user_id, limit=20):
         """Get movie recommendations based on user's mood"""
-        from models import Movie, UserPreference
+        from models import UserPreference
         
         mood = mood.lower()
         
@@ -88,26 +97,16 @@ class MoodMapper:
         # Get user preferences
         user_pref = UserPreference.query.filter_by(user_id=user_id).first()
         
-        # Build query - filter movies with valid poster URLs
-        query = Movie.query.filter(
-            Movie.poster_url.isnot(None),
-            Movie.poster_url != ''
-        )
-        
-        # Filter by mood genres
-        genre_filter = '|'.join(preferred_genres)
-        query = query.filter(Movie.genres.op('REGEXP')(genre_filter))
+        # Filter by mood genres - movies with valid poster URLs only
+        features = self.features.get()
+        mask = features.has_poster & features.genre_mask(preferred_genres)
         
         # Apply user language preference if available
         if user_pref and user_pref.preferred_languages:
-            languages = user_pref.preferred_languages.split(',')
-            query = query.filter(Movie.language.in_(languages))
+            mask &= features.language_mask(user_pref.preferred_languages.split(','))
         
         # Order by rating and popularity
-        movies = query.order_by(
-            Movie.avg_rating.desc(),
-            Movie.popularity.desc()
-        ).limit(limit).all()
+        movies = self._top_unseen(features, mask, user_id, limit, order='rating')
         
         return [{
             **movie.to_dict(),
@@ -116,10 +115,9 @@ class MoodMapper:
             'mood_description': mood_config['description']
         } for movie in movies]
     
+    @timed('mood.get_time_based_recommendations')
     def get_time_based_recommendations(self, user_id, limit=20):
         """Get recommendations based on time of day"""
-        from models import Movie
-        
         current_hour = datetime.now().hour
         
         if current_hour < 12:
@@ -133,15 +131,10 @@ class MoodMapper:
         
         preferred_genres = self.time_context_mapping.get(time_context, ['Drama'])
         
-        genre_filter = '|'.join(preferred_genres)
         # Filter movies with valid poster URLs
-        movies = Movie.query.filter(
-            Movie.poster_url.isnot(None),
-            Movie.poster_url != '',
-            Movie.genres.op('REGEXP')(genre_filter)
-        ).order_by(
-            Movie.avg_rating.desc()
-        ).limit(limit).all()
+        features = self.features.get()
+        mask = features.has_poster & features.genre_mask(preferred_genres)
+        movies = self._top_unseen(features, mask, user_id, limit, order='rating')
         
         return [{
             **movie.to_dict(),
@@ -149,10 +142,9 @@ class MoodMapper:
             'reason': f'Great for {time_context} viewing'
         } for movie in movies]
     
+    @timed('mood.get_seasonal_recommendations')
     def get_seasonal_recommendations(self, user_id, limit=20):
         """Get recommendations based on season/holidays"""
-        from models import Movie
-        
         current_month = datetime.now().month
         
         seasonal_genres = {
@@ -164,21 +156,24 @@ class MoodMapper:
         
         genres = seasonal_genres.get(current_month, ['Drama', 'Comedy'])
         
-        genre_filter = '|'.join(genres)
         # Filter movies with valid poster URLs
-        movies = Movie.query.filter(
-            Movie.poster_url.isnot(None),
-            Movie.poster_url != '',
-            Movie.genres.op('REGEXP')(genre_filter)
-        ).order_by(
-            Movie.popularity.desc()
-        ).limit(limit).all()
+        features = self.features.get()
+        mask = features.has_poster & features.genre_mask(genres)
+        movies = self._top_unseen(features, mask, user_id, limit, order='popularity')
         
         return [{
             **movie.to_dict(),
             'reason': 'Perfect for this season'
         } for movie in movies]
     
+    def _top_unseen(self, features, mask, user_id, limit, order):
+        """Best ``limit`` movies of the mask that the user has not watched or rated"""
+        if self.seen is not None:
+            seen = self.seen.get(user_id)
+            if len(seen):
+                mask = mask & ~seen.mask(features.ids)
+        return features.movies(features.top(mask, limit, order=order))
+    
     def get_available_moods(self):
         """Return all available moods with descriptions"""
         return {
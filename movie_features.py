@@ -0,0 +1,203 @@
+"""
+Movie Features - Columnar in-memory movie attributes for vectorized filtering and ranking
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter
+from itertools import product
+
+import numpy as np
+
+from config import Config
+
+MAX_GENRES = 64  # bits in the genre mask
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+class MovieFeatures:
+    """One snapshot of the catalog as NumPy columns, one row per movie in id order.
+
+    Genres are a bitmask with one bit per genre (the ``MAX_GENRES`` most
+    common; rarer ones match nothing) and languages are dictionary
+    encoded, so filters are boolean masks over whole columns. The
+    orderings shared by the recommenders are lexsorted once: ``popularity``
+    (popularity, then average rating) and ``rating`` (average rating, then
+    popularity), both descending. ``top`` picks the best rows of a mask
+    with an argpartition over the precomputed ranks. ``popular`` answers
+    cold-start queries from per-genre / per-language lists instead. A
+    snapshot is never modified; the store swaps in a new one.
+    """
+
+    def __init__(self, rows, version=None):
+        rows = list(rows)
+        self.version = version
+
+        self.ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.popularity = np.array([row.popularity or 0.0 for row in rows], dtype=np.float32)
+        self.avg_rating = np.array([row.avg_rating or 0.0 for row in rows], dtype=np.float32)
+        self.vote_count = np.array([row.vote_count or 0 for row in rows], dtype=np.int32)
+        self.year = np.array([row.release_date.year if row.release_date else 0 for row in rows], dtype=np.int16)
+        self.runtime = np.array([row.runtime or 0 for row in rows], dtype=np.int32)
+        self.has_poster = np.array([bool(row.poster_url) for row in rows], dtype=bool)
+
+        # Dictionary-encoded languages, -1 for none
+        self.language_codes = {
+            language: code for code, language in enumerate(sorted({row.language for row in rows if row.language}))
+        }
+        self.language = np.array([self.language_codes.get(row.language, -1) for row in rows], dtype=np.int16)
+
+        genre_lists = [_split(row.genres) for row in rows]
+        counts = Counter(genre for genres in genre_lists for genre in genres)
+        self.genre_index = {genre: bit for bit, (genre, _) in enumerate(counts.most_common(MAX_GENRES))}
+        self.genres = np.array([
+            sum(1 << self.genre_index[genre] for genre in set(genres) if genre in self.genre_index)
+            for genres in genre_lists
+        ], dtype=np.uint64)
+
+        self.orders = {
+            'popularity': np.lexsort((-self.avg_rating, -self.popularity)),
+            'rating': np.lexsort((-self.popularity, -self.avg_rating)),
+        }
+        self.ranks = {}
+        for name, order in self.orders.items():
+            ranks = np.empty(len(order), dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            self.ranks[name] = ranks
+
+        self._popular = self._popular_lists()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def genre_mask(self, genres):
+        """Rows with any of ``genres``"""
+        bits = 0
+        for genre in genres:
+            bit = self.genre_index.get(genre.strip())
+            if bit is not None:
+                bits |= 1 << bit
+        return (self.genres & np.uint64(bits)) != 0
+
+    def language_mask(self, languages):
+        """Rows in any of ``languages``"""
+        codes = [self.language_codes[language] for language in languages if language in self.language_codes]
+        return np.isin(self.language, codes)
+
+    def top(self, mask, k, order='popularity'):
+        """Rows of the best ``k`` movies where ``mask`` is True, best first"""
+        rows = np.flatnonzero(mask)
+        if k <= 0 or not len(rows):
+            return rows[:0]
+
+        ranks = self.ranks[order][rows]
+        if len(rows) > k:
+            keep = np.argpartition(ranks, k - 1)[:k]
+            rows, ranks = rows[keep], ranks[keep]
+        return rows[np.argsort(ranks)]
+
+    def popular(self, k, genres=(), languages=(), seen=None):
+        """Rows of the ``k`` most popular movies with posters in any of ``genres`` and
+        ``languages`` (no filter when empty), best first, skipping movies in ``seen``.
+
+        The precomputed lists of the chosen (genre, language) pairs are
+        k-way merged lazily, so only about ``k + len(seen)`` entries are read.
+        """
+        genre_keys = [genre.strip() for genre in genres] if genres else [None]
+        language_keys = [self.language_codes.get(language, -1) for language in languages] if languages else [None]
+        lists = [self._popular[key] for key in product(genre_keys, language_keys) if key in self._popular]
+
+        wanted = k + (len(seen) if seen is not None else 0)
+        ranks = []
+        for rank in heapq.merge(*lists):
+            # A movie is in the list of each of its genres; copies come out adjacent
+            if not ranks or rank != ranks[-1]:
+                ranks.append(rank)
+                if len(ranks) >= wanted:
+                    break
+
+        rows = self.orders['popularity'][np.array(ranks, dtype=np.int64)]
+        if seen is not None and len(seen):
+            rows = rows[~seen.mask(self.ids[rows])]
+        return rows[:k]
+
+    def _popular_lists(self):
+        """Ascending popularity ranks of the movies with posters, per ``(genre, language code)``
+        with ``None`` for any genre or language"""
+        order = self.orders['popularity']
+        ranks = np.flatnonzero(self.has_poster[order])
+        genres = self.genres[order[ranks]]
+        languages = self.language[order[ranks]]
+
+        def by_language(genre, subset):
+            lists[(genre, None)] = ranks[subset].tolist()
+            # Stable sort keeps popularity order within each language
+            subset = subset[np.argsort(languages[subset], kind='stable')]
+            codes, starts = np.unique(languages[subset], return_index=True)
+            for code, part in zip(codes.tolist(), np.split(subset, starts[1:])):
+                if code >= 0:
+                    lists[(genre, code)] = ranks[part].tolist()
+
+        lists = {}
+        by_language(None, np.arange(len(ranks)))
+        for genre, bit in self.genre_index.items():
+            by_language(genre, np.flatnonzero(genres & np.uint64(1 << bit)))
+        return lists
+
+    def movies(self, rows):
+        """``Movie`` objects for ``rows``, in the same order"""
+        from models import Movie
+
+        ids = self.ids[rows].tolist()
+        if not ids:
+            return []
+        movies_by_id = {movie.id: movie for movie in Movie.query.filter(Movie.id.in_(ids))}
+        return [movies_by_id[movie_id] for movie_id in ids if movie_id in movies_by_id]
+
+
+class MovieFeatureStore:
+    """The current ``MovieFeatures``, rebuilt once per catalog version.
+
+    The catalog fingerprint (the same one that versions the HTTP cache) is
+    checked at most every ``check_interval`` seconds, so movies added or
+    edited by other processes show up within that time. ``invalidate``
+    makes the next ``get`` check at once.
+    """
+
+    def __init__(self, check_interval=Config.MOVIE_FEATURES_CHECK_INTERVAL):
+        self.check_interval = check_interval
+
+        self._features = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        features = self._features
+        if features is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return features
+
+        from http_cache import catalog_fingerprint
+
+        with self._lock:
+            if self._features is None or time.monotonic() - self._checked_at >= self.check_interval:
+                version = list(catalog_fingerprint())
+                if self._features is None or self._features.version != version:
+                    self._features = self.build(version)
+                self._checked_at = time.monotonic()
+            return self._features
+
+    def build(self, version=None):
+        from models import db, Movie
+
+        rows = db.session.query(
+            Movie.id, Movie.popularity, Movie.avg_rating, Movie.vote_count, Movie.release_date,
+            Movie.runtime, Movie.language, Movie.genres, Movie.poster_url
+        ).order_by(Movie.id).yield_per(10000)
+        return MovieFeatures(rows, version)
+
+    def invalidate(self):
+        self._checked_at = 0.0
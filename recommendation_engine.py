@@ -1,23 +1,91 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import TruncatedSVD
-from datetime import datetime, timedelta
-from collections import defaultdict
-import pickle
-import os
+
+from ann_index import IVFIndex
+from co_occurrence import CoOccurrenceIndex
+from config import Config
+from metrics import timed
+from movie_features import MovieFeatureStore
+from seen_sets import SeenSets
+from taste_profiles import TasteProfiles
+from trending import TrendingCounters
+
+# scipy and scikit-learn are imported inside the build methods so that
+# importing the engine (and starting the app) stays cheap; they load on
+# the first model build.
+
+# The content model's row mapping, vectors and top-k neighbor lists (rows
+# and scores, or None until built), published together in one assignment
+# so a reader never pairs ids with rows of another version
+ContentIndex = namedtuple('ContentIndex', 'movie_ids movie_index embeddings similarity neighbors')
 
 class RecommendationEngine:
-    def __init__(self):
-        self.tfidf_vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
-        self.content_similarity_matrix = None
+    def __init__(self, embedding_dim=Config.CONTENT_EMBEDDING_DIM):
+        self.tfidf_vectorizer = None
+        self.embedding_dim = embedding_dim
+        self.lsa_model = None
+        self.content_index = ContentIndex([], {}, None, None, None)
+        self.content_model_version = 0  # bumped on every content model (re)build
         self.user_item_matrix = None
         self.svd_model = None
+        self.user_factors = None
+        self.item_factors = None
+        self._collaborative_trained_at = 0.0  # monotonic time of the last out-of-core fit
+        self._collaborative_retrain_lock = threading.Lock()
         self.movie_features = {}
-        
+        self.trending = TrendingCounters()
+        self.co_occurrence = CoOccurrenceIndex()
+        self.taste = TasteProfiles()
+        self.seen = SeenSets()  # watched or rated movies, excluded from every recommender
+        self.features = MovieFeatureStore()
+        self.user_index = {}
+        self.item_col_index = {}
+        self.item_index = None
+        self.item_similarity_index = None
+        
+        # Implicit-feedback ALS over watch history (see build_implicit_model)
+        self.implicit_model = None
+        self.implicit_counts = None
+        self.implicit_user_index = {}
+        self.implicit_item_index = None
+        
+        # Incremental content updates (see update_content_items)
+        self._content_lock = threading.RLock()
+        self._neighbors_build_lock = threading.Lock()
+        self._content_drift = None
+        self._content_synced_at = 0.0
+        
+    # Read-only views of the current content index; readers that need more
+    # than one of them take ``self.content_index`` once instead
+    @property
+    def movie_ids(self):
+        return self.content_index.movie_ids
+    
+    @property
+    def movie_index(self):
+        return self.content_index.movie_index
+    
+    @property
+    def movie_embeddings(self):
+        return self.content_index.embeddings
+    
+    @property
+    def content_similarity_matrix(self):
+        return self.content_index.similarity
+    
+    @staticmethod
+    def _movie_features(movie):
+        return f"{movie.title} {movie.overview} {movie.genres} {movie.cast} {movie.director}"
+    
+    @timed('engine.build_content_based_model')
     def build_content_based_model(self):
         """Build content-based filtering model using TF-IDF"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics.pairwise import cosine_similarity
         from models import Movie
         
         movies = Movie.query.all()
@@ -27,116 +95,461 @@ class RecommendationEngine:
         movie_ids = []
         
         for movie in movies:
-            features = f"{movie.title} {movie.overview} {movie.genres} {movie.cast} {movie.director}"
-            movie_features.append(features)
+            movie_features.append(self._movie_features(movie))
             movie_ids.append(movie.id)
         
         # Calculate TF-IDF matrix
+        self.tfidf_vectorizer = TfidfVectorizer(max_features=5000, stop_words='english')
         tfidf_matrix = self.tfidf_vectorizer.fit_transform(movie_features)
+        movie_index = {movie_id: idx for idx, movie_id in enumerate(movie_ids)}
+        self._content_drift = {
+            'fitted': len(movie_ids),
+            'baseline_oov': self._oov_ratio(movie_features[:Config.CONTENT_DRIFT_SAMPLE]),
+            'added': 0,
+            'tokens': 0,
+            'oov': 0
+        }
+        
+        if self.embedding_dim:
+            # Compact LSA embedding; similarities are computed on demand
+            embeddings = self._fit_embeddings(tfidf_matrix)
+            self.content_index = ContentIndex(movie_ids, movie_index, embeddings, None, None)
+            self.content_model_version += 1
+            return embeddings
         
         # Calculate cosine similarity
-        self.content_similarity_matrix = cosine_similarity(tfidf_matrix)
-        self.movie_ids = movie_ids
+        similarity = cosine_similarity(tfidf_matrix)
+        self.content_index = ContentIndex(movie_ids, movie_index, None, similarity, None)
+        self.content_model_version += 1
         
-        return self.content_similarity_matrix
+        return similarity
     
-    def build_collaborative_model(self):
-        """Build collaborative filtering model using SVD"""
-        from models import Rating
+    def _fit_embeddings(self, tfidf_matrix):
+        """Reduce TF-IDF rows to L2-normalized float32 LSA vectors"""
+        from sklearn.decomposition import TruncatedSVD
+        
+        n_components = min(self.embedding_dim, tfidf_matrix.shape[0] - 1, tfidf_matrix.shape[1] - 1)
+        
+        self.lsa_model = TruncatedSVD(n_components=max(n_components, 1), random_state=42)
+        embeddings = self.lsa_model.fit_transform(tfidf_matrix).astype(np.float32)
         
-        ratings = Rating.query.all()
+        return self._normalize(embeddings)
+    
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def _content_model_ready(self):
+        return self.movie_embeddings is not None or self.content_similarity_matrix is not None
+    
+    def content_scores(self, movie_indices, content=None):
+        """Content similarity of the given movie rows against every movie (of ``content``)"""
+        content = content or self.content_index
+        if content.embeddings is not None:
+            return content.embeddings[movie_indices] @ content.embeddings.T
+        return content.similarity[movie_indices]
+    
+    @timed('engine.build_content_neighbors')
+    def build_content_neighbors(self, k=10, block_size=1024, workers=1, progress=None):
+        """Sparse N x N matrix holding each movie's top-k content neighbors.
+        
+        ``workers > 1`` computes the row blocks in a process pool (see
+        content_neighbors.py); the result is identical for any worker count.
+        The lists are kept in the content index, where similar-movie lookups
+        read them and update_content_items patches them.
+        """
+        from scipy import sparse
+        from content_neighbors import build_neighbor_lists
+        
+        if not self._content_model_ready():
+            self.build_content_based_model()
         
-        # Create user-item matrix
-        data = []
-        for rating in ratings:
-            data.append({
-                'user_id': rating.user_id,
-                'movie_id': rating.movie_id,
-                'rating': rating.rating
-            })
+        content = self.content_index
+        n_movies = len(content.movie_ids)
+        k = min(k, n_movies - 1)
+        if k <= 0:
+            return sparse.csr_matrix((n_movies, n_movies), dtype=np.float32)
+        
+        # Reuse lists kept up to date by update_content_items
+        if content.neighbors is not None and content.neighbors[0].shape[1] >= k:
+            indices, values = content.neighbors[0][:, :k], content.neighbors[1][:, :k]
+        else:
+            similarity = content.embeddings is None
+            indices, values = build_neighbor_lists(
+                content.similarity if similarity else content.embeddings,
+                k, block_size=block_size, workers=workers, similarity=similarity, progress=progress
+            )
+            with self._content_lock:
+                # Unless the index changed meanwhile (the lists would be for old rows)
+                if self.content_index is content:
+                    self.content_index = content._replace(neighbors=(indices, values))
+        
+        indices, values = np.ascontiguousarray(indices), np.ascontiguousarray(values)
+        return sparse.csr_matrix(
+            (values.ravel(), indices.ravel(), np.arange(0, n_movies * k + 1, k)),
+            shape=(n_movies, n_movies)
+        )
+    
+    def schedule_content_neighbors(self):
+        """Build the neighbor lists in the background when the content index has none.
+        
+        Covers processes that skipped the warm-up and the rows of a refit
+        index; from then on update_content_items keeps the lists patched.
+        """
+        from concurrency import submit_in_app_context
+        
+        content = self.content_index
+        if not Config.CONTENT_NEIGHBORS or content.embeddings is None or content.neighbors is not None:
+            return
+        if not self._neighbors_build_lock.acquire(blocking=False):
+            return  # a build is already running
+        
+        def build():
+            try:
+                self.build_content_neighbors(k=Config.CONTENT_NEIGHBORS)
+            finally:
+                self._neighbors_build_lock.release()
         
-        if not data:
+        try:
+            submit_in_app_context(build)
+        except Exception:
+            self._neighbors_build_lock.release()
+            raise
+    
+    def _oov_ratio(self, texts):
+        """Share of (non stop-word) tokens in ``texts`` missing from the fitted vocabulary"""
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        total = oov = 0
+        for text in texts:
+            tokens = analyzer(text)
+            total += len(tokens)
+            oov += sum(1 for token in tokens if token not in vocabulary)
+        return oov / total if total else 0.0
+    
+    @timed('engine.update_content_items')
+    def update_content_items(self, movie_ids):
+        """Add or re-embed movies without refitting the content model.
+        
+        New and edited movies are projected with the fitted TF-IDF vocabulary
+        and LSA basis, and cached neighbor lists are patched for just the
+        affected rows. Falls back to a full rebuild when the vocabulary has
+        drifted (too many unknown tokens) or the catalog has grown too much
+        since the last fit. Returns True if the model was refit.
+        """
+        from models import Movie
+        from content_neighbors import patch_neighbor_lists
+        
+        movie_ids = list(movie_ids)
+        self.features.invalidate()
+        if not movie_ids or not self._content_model_ready():
+            return False  # built lazily with everything in it
+        
+        with self._content_lock:
+            if self.movie_embeddings is None:
+                self.build_content_based_model()  # dense similarity mode has no incremental path
+                return True
+            
+            movies = Movie.query.filter(Movie.id.in_(movie_ids)).order_by(Movie.id).all()
+            if not movies:
+                return False
+            features = [self._movie_features(movie) for movie in movies]
+            
+            drift = self._content_drift
+            added = sum(1 for movie in movies if movie.id not in self.movie_index)
+            analyzer = self.tfidf_vectorizer.build_analyzer()
+            for text in features:
+                tokens = analyzer(text)
+                drift['tokens'] += len(tokens)
+                drift['oov'] += sum(1 for token in tokens if token not in self.tfidf_vectorizer.vocabulary_)
+            drift['added'] += added
+            
+            oov_increase = drift['oov'] / drift['tokens'] - drift['baseline_oov'] if drift['tokens'] else 0.0
+            if (oov_increase > Config.CONTENT_DRIFT_THRESHOLD
+                    or drift['added'] > Config.CONTENT_REFIT_GROWTH * drift['fitted']):
+                self.build_content_based_model()
+                return True
+            
+            vectors = self._normalize(
+                self.lsa_model.transform(self.tfidf_vectorizer.transform(features)).astype(np.float32)
+            )
+            
+            content = self.content_index
+            embeddings = content.embeddings.copy()
+            movie_ids, movie_index = list(content.movie_ids), dict(content.movie_index)
+            new_vectors, changed_rows = [], []
+            for movie, vector in zip(movies, vectors):
+                row = movie_index.get(movie.id)
+                if row is None:
+                    row = movie_index[movie.id] = len(movie_ids)
+                    movie_ids.append(movie.id)
+                    new_vectors.append(vector)
+                else:
+                    embeddings[row] = vector
+                changed_rows.append(row)
+            if new_vectors:
+                embeddings = np.vstack([embeddings, np.array(new_vectors, dtype=np.float32)])
+            
+            neighbors = None
+            if content.neighbors is not None:
+                neighbors = patch_neighbor_lists(*content.neighbors, embeddings, changed_rows)
+            
+            # Copies, swapped in with one assignment: readers holding the old
+            # snapshot keep consistent ids, rows and neighbor lists
+            self.content_index = ContentIndex(movie_ids, movie_index, embeddings, None, neighbors)
+            self.content_model_version += 1
+            
+            return False
+    
+    def sync_content_index(self, force=False):
+        """Pick up movies added by other processes (loaders, TMDB import) since the last fit.
+        
+        Checks at most every ``CONTENT_SYNC_INTERVAL`` seconds unless ``force``.
+        """
+        from models import db, Movie
+        
+        if not self._content_model_ready() or not self.movie_ids:
+            return []
+        now = time.monotonic()
+        if not force and now - self._content_synced_at < Config.CONTENT_SYNC_INTERVAL:
+            return []
+        self._content_synced_at = now
+        
+        new_ids = [movie_id for (movie_id,) in db.session.query(Movie.id).filter(Movie.id > max(self.movie_ids))]
+        if new_ids:
+            self.update_content_items(new_ids)
+        return new_ids
+    
+    def embed_text(self, text):
+        """Project free text (a search query, mood keywords) into the content space"""
+        if not self._content_model_ready():
+            self.build_content_based_model()
+        
+        if self.movie_embeddings is None:
             return None
         
-        df = pd.DataFrame(data)
-        self.user_item_matrix = df.pivot_table(
-            index='user_id',
-            columns='movie_id',
-            values='rating'
-        ).fillna(0)
+        tfidf = self.tfidf_vectorizer.transform([text])
+        return self._normalize(self.lsa_model.transform(tfidf).astype(np.float32))[0]
+    
+    def search_by_text(self, text, limit=20, min_score=0.1):
+        """Movie ids ranked by semantic similarity to free text"""
+        self.sync_content_index()
+        query = self.embed_text(text)
+        content = self.content_index
+        if query is None or not content.movie_ids:
+            return []
+        
+        scores = content.embeddings @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        return [(content.movie_ids[i], float(scores[i])) for i in top if scores[i] >= min_score]
+    
+    @timed('engine.build_collaborative_model')
+    def build_collaborative_model(self, out_of_core=None, progress=None):
+        """Build collaborative filtering model using SVD
+        
+        Out of core (``Config.COLLABORATIVE_OUT_OF_CORE``) the ratings are
+        streamed in chunks into a randomized SVD and no ratings matrix is
+        kept; the method then returns the fitted model instead of the matrix.
+        """
+        from scipy import sparse
+        from sklearn.decomposition import TruncatedSVD
+        from models import db, Rating
+        
+        if out_of_core is None:
+            out_of_core = Config.COLLABORATIVE_OUT_OF_CORE
+        if out_of_core:
+            return self._build_collaborative_model_streamed(progress)
+        
+        ratings = db.session.query(Rating.user_id, Rating.movie_id, Rating.rating).all()
+        
+        if not ratings:
+            return None
+        
+        # Create sparse user-item matrix (unrated cells are implicit zeros)
+        user_ids, movie_ids, values = (np.array(column) for column in zip(*ratings))
+        self.user_ids, user_rows = np.unique(user_ids, return_inverse=True)
+        self.item_ids, item_cols = np.unique(movie_ids, return_inverse=True)
+        self.user_item_matrix = sparse.csr_matrix(
+            (values.astype(np.float32), (user_rows, item_cols)),
+            shape=(len(self.user_ids), len(self.item_ids))
+        )
         
         # Apply SVD
-        self.svd_model = TruncatedSVD(n_components=min(50, len(self.user_item_matrix) - 1))
+        n_components = min(50, self.user_item_matrix.shape[0] - 1, self.user_item_matrix.shape[1] - 1)
+        self.svd_model = TruncatedSVD(n_components=max(n_components, 1))
         self.user_factors = self.svd_model.fit_transform(self.user_item_matrix)
         self.item_factors = self.svd_model.components_.T
         
+        self._index_collaborative_factors()
+        
         return self.user_item_matrix
     
+    def _build_collaborative_model_streamed(self, progress=None):
+        from collaborative_training import StreamingSVD
+        
+        model = StreamingSVD(n_components=50).fit(progress=progress)
+        if model is None:
+            return None
+        
+        self.user_ids, self.item_ids = model.user_ids, model.item_ids
+        self.user_item_matrix = None
+        self.svd_model = model
+        self.user_factors = model.user_factors_
+        self.item_factors = model.components_.T
+        self._collaborative_trained_at = time.monotonic()
+        
+        self._index_collaborative_factors()
+        
+        return model
+    
+    def _index_collaborative_factors(self):
+        self.user_index = {user_id: idx for idx, user_id in enumerate(self.user_ids.tolist())}
+        self.item_col_index = {movie_id: idx for idx, movie_id in enumerate(self.item_ids.tolist())}
+        
+        # ANN indexes: user→item for predicted ratings, item→item for "because you liked"
+        n_lists = None if len(self.item_ids) >= Config.ANN_MIN_ITEMS else 1
+        self.item_index = IVFIndex(metric='ip', n_lists=n_lists).build(self.item_factors, self.item_ids)
+        self.item_similarity_index = IVFIndex(metric='cosine', n_lists=n_lists).build(self.item_factors, self.item_ids)
+    
+    @timed('engine.build_implicit_model')
+    def build_implicit_model(self):
+        """Build implicit-feedback ALS model from watch counts"""
+        from scipy import sparse
+        from implicit_als import ImplicitALS, watch_counts
+        
+        counts = watch_counts()
+        if counts is None:
+            return None
+        
+        user_ids, movie_ids, values = counts
+        user_ids, user_rows = np.unique(user_ids, return_inverse=True)
+        item_ids, item_cols = np.unique(movie_ids, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (values.astype(np.float32), (user_rows, item_cols)),
+            shape=(len(user_ids), len(item_ids))
+        )
+        model = ImplicitALS().fit(matrix)
+        
+        n_lists = None if len(item_ids) >= Config.ANN_MIN_ITEMS else 1
+        self.implicit_item_ids = item_ids
+        self.implicit_item_index = IVFIndex(metric='ip', n_lists=n_lists).build(model.item_factors, item_ids)
+        self.implicit_user_index = {user_id: idx for idx, user_id in enumerate(user_ids.tolist())}
+        self.implicit_counts = matrix
+        self.implicit_model = model
+        
+        return matrix
+    
+    def _implicit_warm(self, user_id):
+        """Whether the user has watched enough movies to get implicit recommendations"""
+        if not Config.IMPLICIT_ENABLED:
+            return False
+        if self.implicit_model is None:
+            self.build_implicit_model()
+        row = self.implicit_user_index.get(user_id)
+        if row is None:
+            return False
+        return self.implicit_counts.indptr[row + 1] - self.implicit_counts.indptr[row] >= Config.MIN_WATCHES_FOR_IMPLICIT
+    
+    @timed('engine.get_implicit_recommendations')
+    def get_implicit_recommendations(self, user_id, limit=10):
+        """Get recommendations from the user's watch history"""
+        from models import Movie
+        
+        if self.implicit_model is None:
+            self.build_implicit_model()
+        
+        if self.implicit_model is None or user_id not in self.implicit_user_index:
+            return []
+        
+        user_vector = self.implicit_model.user_factors[self.implicit_user_index[user_id]]
+        
+        # Skip movies the user already watched or rated
+        movie_ids, scores = self.implicit_item_index.search(user_vector, limit, exclude=self.seen.get(user_id))
+        movie_scores = dict(zip(movie_ids.tolist(), scores.tolist()))
+        
+        # Filter movies that have valid poster URLs
+        movies = Movie.query.filter(
+            Movie.id.in_(list(movie_scores)),
+            Movie.poster_url.isnot(None),
+            Movie.poster_url != ''
+        ).all()
+        
+        return [{
+            **movie.to_dict(),
+            'implicit_score': movie_scores[movie.id],
+            'reason': 'Watched by people who watch what you watch'
+        } for movie in movies]
+    
+    @timed('engine.get_content_based_recommendations')
     def get_content_based_recommendations(self, movie_id, limit=10):
         """Get similar movies based on content"""
         from models import Movie
         
-        if self.content_similarity_matrix is None:
+        if not self._content_model_ready():
             self.build_content_based_model()
+        self.sync_content_index()
         
-        try:
-            movie_idx = self.movie_ids.index(movie_id)
-        except ValueError:
-            return []
+        self.schedule_content_neighbors()
         
-        # Get similarity scores
-        similarity_scores = list(enumerate(self.content_similarity_matrix[movie_idx]))
-        similarity_scores = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
+        content = self.content_index
+        movie_idx = content.movie_index.get(movie_id)
+        if movie_idx is None:
+            return []
         
-        # Get top similar movies (excluding itself)
-        similar_indices = [i[0] for i in similarity_scores[1:limit+1]]
-        similar_movie_ids = [self.movie_ids[i] for i in similar_indices]
+        if content.neighbors is not None and content.neighbors[0].shape[1] >= limit:
+            # Precomputed top-k lists (already without the movie itself)
+            indices, values = content.neighbors[0][movie_idx, :limit], content.neighbors[1][movie_idx, :limit]
+            similar_scores = {content.movie_ids[i]: float(score) for i, score in zip(indices.tolist(), values.tolist())}
+        else:
+            # Get similarity scores (excluding the movie itself)
+            scores = np.array(self.content_scores(movie_idx, content), dtype=np.float32)
+            scores[movie_idx] = -np.inf
+            
+            # Get top similar movies
+            k = min(limit, len(scores) - 1)
+            if k <= 0:
+                return []
+            similar_indices = np.argpartition(-scores, k - 1)[:k]
+            similar_scores = {content.movie_ids[i]: float(scores[i]) for i in similar_indices}
         
         # Filter movies that have valid poster URLs
         movies = Movie.query.filter(
-            Movie.id.in_(similar_movie_ids),
+            Movie.id.in_(list(similar_scores)),
             Movie.poster_url.isnot(None),
             Movie.poster_url != ''
         ).all()
         
         return [{
             **movie.to_dict(),
-            'similarity_score': similarity_scores[similar_indices.index(self.movie_ids.index(movie.id)) + 1][1],
+            'similarity_score': similar_scores[movie.id],
             'reason': f'Similar content to your selection'
         } for movie in movies]
     
+    @timed('engine.get_collaborative_recommendations')
     def get_collaborative_recommendations(self, user_id, limit=10):
         """Get recommendations based on collaborative filtering"""
         from models import Movie
         
-        if self.user_item_matrix is None or self.svd_model is None:
+        if self.svd_model is None:
             self.build_collaborative_model()
         
-        if self.user_item_matrix is None:
+        if self.svd_model is None:
             return []
         
-        if user_id not in self.user_item_matrix.index:
+        if user_id not in self.user_index:
             return []
         
         # Get user's latent factors
-        user_idx = list(self.user_item_matrix.index).index(user_id)
-        user_vector = self.user_factors[user_idx]
-        
-        # Calculate predicted ratings
-        predicted_ratings = np.dot(user_vector, self.item_factors.T)
-        
-        # Get user's already rated movies
-        rated_movies = self.user_item_matrix.loc[user_id]
-        rated_movie_ids = rated_movies[rated_movies > 0].index.tolist()
+        user_vector = self.user_factors[self.user_index[user_id]]
         
-        # Create recommendations
-        movie_scores = []
-        for idx, movie_id in enumerate(self.user_item_matrix.columns):
-            if movie_id not in rated_movie_ids:
-                movie_scores.append((movie_id, predicted_ratings[idx]))
-        
-        # Sort by predicted rating
-        movie_scores = sorted(movie_scores, key=lambda x: x[1], reverse=True)[:limit]
+        # Highest predicted ratings among unwatched, unrated movies, via the ANN index
+        movie_ids, scores = self.item_index.search(user_vector, limit, exclude=self.seen.get(user_id))
+        movie_scores = list(zip(movie_ids.tolist(), scores.tolist()))
         
         recommended_movie_ids = [m[0] for m in movie_scores]
         # Filter movies that have valid poster URLs
@@ -152,31 +565,152 @@ class RecommendationEngine:
             'reason': 'Users with similar taste enjoyed this'
         } for movie in movies]
     
-    def get_hybrid_recommendations(self, user_id, limit=20):
-        """Combine content-based and collaborative filtering"""
+    @timed('engine.get_item_item_recommendations')
+    def get_item_item_recommendations(self, movie_id, limit=10, exclude=None):
+        """Movies whose latent factors are closest to the given movie's"""
+        from models import Movie
+        
+        if self.item_similarity_index is None:
+            self.build_collaborative_model()
+        
+        if self.item_similarity_index is None or movie_id not in self.item_col_index:
+            return []
+        
+        exclude = set(exclude or ()) | {movie_id}
+        movie_ids, scores = self.item_similarity_index.search(
+            self.item_similarity_index.vector(movie_id), limit, exclude=exclude
+        )
+        movie_scores = dict(zip(movie_ids.tolist(), scores.tolist()))
+        
+        # Filter movies that have valid poster URLs
+        movies = Movie.query.filter(
+            Movie.id.in_(list(movie_scores)),
+            Movie.poster_url.isnot(None),
+            Movie.poster_url != ''
+        ).all()
+        
+        return sorted([{
+            **movie.to_dict(),
+            'similarity_score': movie_scores[movie.id]
+        } for movie in movies], key=lambda x: x['similarity_score'], reverse=True)
+    
+    def get_because_you_liked(self, user_id, limit=10):
+        """Item-item recommendations anchored on the user's favourite movie"""
         from models import Rating, Movie
         
+        ratings = Rating.query.filter_by(user_id=user_id).order_by(
+            Rating.rating.desc(),
+            Rating.timestamp.desc()
+        ).all()
+        
+        if not ratings:
+            return None, []
+        
+        # Highest-rated movie still in the catalog (a rated movie may have been deleted)
+        movies = {movie.id: movie for movie in Movie.query.filter(
+            Movie.id.in_([rating.movie_id for rating in ratings])
+        )}
+        anchor = next((movies[rating.movie_id] for rating in ratings if rating.movie_id in movies), None)
+        if anchor is None:
+            return None, []
+        
+        recs = self.get_item_item_recommendations(
+            anchor.id, limit, exclude={rating.movie_id for rating in ratings}
+        )
+        
+        return anchor, [{
+            **rec,
+            'reason': f'Because you liked {anchor.title}'
+        } for rec in recs]
+    
+    @timed('engine.get_hybrid_recommendations')
+    def get_hybrid_recommendations(self, user_id, limit=20):
+        """Combine content-based, collaborative and watch-history filtering"""
+        from models import Rating
+        
+        # Rating count and content candidates come from the user's maintained taste
+        # vector; without content embeddings, from per-request top-rated lookups
+        taste = self._taste_profiles_ready()
+        
         # Check if user has ratings
-        user_ratings = Rating.query.filter_by(user_id=user_id).count()
+        if taste:
+            user_ratings = self.taste.rating_count(user_id)
+        else:
+            user_ratings = Rating.query.filter_by(user_id=user_id).count()
+        implicit = self._implicit_warm(user_id)
         
-        if user_ratings < 5:
+        if user_ratings < 5 and not implicit:
             # Cold start: use content-based + popular
             return self.cold_start_recommendations(user_id, limit)
         
-        # Get both types of recommendations
-        collab_recs = self.get_collaborative_recommendations(user_id, limit)
-        
-        # Get user's top-rated movies
-        top_rated = Rating.query.filter_by(user_id=user_id).order_by(
-            Rating.rating.desc()
-        ).limit(3).all()
+        # Get both types of recommendations (plus watch-history ones when there are enough views)
+        collab_recs = self.get_collaborative_recommendations(user_id, limit) if user_ratings >= 5 else []
+        implicit_recs = self.get_implicit_recommendations(user_id, limit) if implicit else []
+        
+        if taste:
+            content_recs = self.get_taste_recommendations(user_id, limit)
+        else:
+            # Get user's top-rated movies
+            content_recs = []
+            for movie_id in self._top_rated_movie_ids(user_id):
+                content_recs.extend(
+                    self.get_content_based_recommendations(movie_id, limit=5)
+                )
+            content_recs = self.seen.get(user_id).filter(content_recs)
+        
+        return self._merge_hybrid(collab_recs, content_recs, limit, implicit_recs)
+    
+    @timed('engine.get_hybrid_recommendations_async')
+    async def get_hybrid_recommendations_async(self, user_id, limit=20):
+        """Same results as ``get_hybrid_recommendations`` with the independent
+        queries and scoring steps awaited concurrently (call from an async view)"""
+        from concurrency import run_blocking
+        from models import Rating
         
-        content_recs = []
-        for rating in top_rated:
-            content_recs.extend(
-                self.get_content_based_recommendations(rating.movie_id, limit=5)
+        taste = await run_blocking(self._taste_profiles_ready, kind='cpu')
+        if taste:
+            user_ratings, top_rated = self.taste.rating_count(user_id), None
+        else:
+            user_ratings, top_rated = await asyncio.gather(
+                run_blocking(lambda: Rating.query.filter_by(user_id=user_id).count()),
+                run_blocking(self._top_rated_movie_ids, user_id)
             )
         
+        if Config.IMPLICIT_ENABLED and self.implicit_model is None:
+            await run_blocking(self.build_implicit_model, kind='cpu')
+        implicit = self._implicit_warm(user_id)
+        
+        if user_ratings < 5 and not implicit:
+            return await run_blocking(self.cold_start_recommendations, user_id, limit)
+        
+        # Build missing models once, before the lookups fan out
+        if user_ratings >= 5 and self.svd_model is None:
+            await run_blocking(self.build_collaborative_model, kind='cpu')
+        
+        collab_recs, implicit_recs, *content_lists = await asyncio.gather(
+            run_blocking(self.get_collaborative_recommendations, user_id, limit, kind='cpu')
+            if user_ratings >= 5 else asyncio.sleep(0, result=[]),
+            run_blocking(self.get_implicit_recommendations, user_id, limit, kind='cpu')
+            if implicit else asyncio.sleep(0, result=[]),
+            *([run_blocking(self.get_taste_recommendations, user_id, limit, kind='cpu')] if taste else
+              [run_blocking(self.get_content_based_recommendations, movie_id, 5, kind='cpu')
+               for movie_id in top_rated])
+        )
+        content_recs = [rec for recs in content_lists for rec in recs]
+        if not taste:
+            content_recs = self.seen.get(user_id).filter(content_recs)
+        
+        return self._merge_hybrid(collab_recs, content_recs, limit, implicit_recs)
+    
+    def _top_rated_movie_ids(self, user_id, n=3):
+        from models import Rating
+        
+        return [movie_id for (movie_id,) in Rating.query.with_entities(Rating.movie_id).filter_by(
+            user_id=user_id
+        ).order_by(Rating.rating.desc()).limit(n)]
+    
+    @timed('engine.hybrid.merge')
+    def _merge_hybrid(self, collab_recs, content_recs, limit, implicit_recs=()):
         # Combine and deduplicate
         all_recs = {}
         
@@ -198,72 +732,196 @@ class RecommendationEngine:
                     'score': rec.get('similarity_score', 0) * 0.4
                 }
         
+        # Add watch-history recommendations
+        for rec in implicit_recs:
+            if rec['id'] in all_recs:
+                all_recs[rec['id']]['score'] += rec.get('implicit_score', 0) * Config.IMPLICIT_WEIGHT
+                all_recs[rec['id']]['reason'] += ' & ' + rec['reason']
+            else:
+                all_recs[rec['id']] = {
+                    **rec,
+                    'score': rec.get('implicit_score', 0) * Config.IMPLICIT_WEIGHT
+                }
+        
         # Sort by combined score
         sorted_recs = sorted(all_recs.values(), key=lambda x: x['score'], reverse=True)
         
         return sorted_recs[:limit]
     
+    @timed('engine.diversify')
+    def diversify(self, recs, limit, relevance_weight):
+        """Re-rank recommendations by maximal marginal relevance over the content embeddings
+        (by ``score`` when every item has one, else by the current order)"""
+        from diversity import mmr
+        
+        if not self._content_model_ready():
+            self.build_content_based_model()
+        
+        content = self.content_index
+        embeddings, movie_index = content.embeddings, content.movie_index
+        if embeddings is None or relevance_weight >= 1 or len(recs) <= 1:
+            return recs[:limit]
+        
+        vectors = np.zeros((len(recs), embeddings.shape[1]), dtype=np.float32)
+        rows = [movie_index.get(rec['id']) for rec in recs]
+        known = [i for i, row in enumerate(rows) if row is not None and row < len(embeddings)]
+        vectors[known] = embeddings[[rows[i] for i in known]]
+        
+        scores = [rec.get('score') for rec in recs]
+        relevance = None if None in scores else scores
+        
+        return [recs[i] for i in mmr(vectors, limit, relevance_weight, relevance)]
+    
+    @timed('engine.cold_start_recommendations')
     def cold_start_recommendations(self, user_id, limit=20):
         """Recommendations for new users"""
-        from models import Movie, UserPreference
+        from models import UserPreference
         
         # Get user preferences
         pref = UserPreference.query.filter_by(user_id=user_id).first()
         
-        # Filter movies that have valid poster URLs
-        query = Movie.query.filter(
+        genres = pref.favorite_genres.split(',') if pref and pref.favorite_genres else ()
+        languages = pref.preferred_languages.split(',') if pref and pref.preferred_languages else ()
+        
+        # Get popular movies (with valid poster URLs) from the precomputed per-genre/language
+        # lists, skipping movies the user already watched or rated
+        features = self.features.get()
+        rows = features.popular(limit, genres, languages, seen=self.seen.get(user_id))
+        movies = features.movies(rows)
+        
+        return [{
+            **movie.to_dict(),
+            'reason': 'Popular in your preferred genres'
+        } for movie in movies]
+    
+    @timed('engine.get_trending_movies')
+    def get_trending_movies(self, days=7, limit=20, decay=False, user_id=None):
+        """Get trending movies based on recent activity (minus the ones a given user has seen)"""
+        from models import Movie
+        
+        self.trending.ensure_loaded()
+        self.trending.refresh()
+        
+        ranked = self.trending.top(days, decay=decay)
+        if ranked and user_id is not None:
+            seen = self.seen.get(user_id).mask([movie_id for movie_id, _ in ranked])
+            ranked = [item for item, hide in zip(ranked, seen) if not hide]
+        if not ranked:
+            return []
+        
+        # Filter movies that have valid poster URLs, keeping the ranked order
+        movies = Movie.query.filter(
+            Movie.id.in_([movie_id for movie_id, _ in ranked]),
             Movie.poster_url.isnot(None),
             Movie.poster_url != ''
-        )
+        ).all()
+        movies_by_id = {movie.id: movie for movie in movies}
+        
+        reason = 'Trending right now' if decay else f'Trending in last {days} days'
+        
+        return [{
+            **movies_by_id[movie_id].to_dict(),
+            'trending_score': score,
+            'reason': reason
+        } for movie_id, score in ranked if movie_id in movies_by_id][:limit]
+    
+    def record_activity(self, movie_id, timestamp=None, user_id=None, rating=None):
+        """Count a rating or watch event towards trending (and, given the user, the seen set,
+        co-occurrence and the user's taste vector)"""
+        self.trending.record(movie_id, timestamp)
+        if user_id is not None:
+            self.seen.add(user_id, movie_id)
+            self.co_occurrence.record(user_id, movie_id, rating)
+            if rating is not None:
+                self.update_taste_profile(user_id, movie_id, rating)
+    
+    def update_taste_profile(self, user_id, movie_id, rating):
+        """Fold one new or changed rating into the user's taste vector, in O(d)"""
+        content = self.content_index
+        if self.taste.basis is None or self.taste.basis is not self.lsa_model or content.embeddings is None:
+            return  # built (with this rating) from the database on first use
+        self.taste.update(user_id, movie_id, rating, content.embeddings, content.movie_index)
+    
+    def _taste_profiles_ready(self):
+        """Build or refresh the taste vectors; False when there are no content embeddings"""
+        if not self._content_model_ready():
+            self.build_content_based_model()
+        content = self.content_index
+        if content.embeddings is None:
+            return False
+        
+        if self.taste.basis is not self.lsa_model:
+            self.taste.build(content.embeddings, content.movie_index, self.lsa_model)
+        else:
+            self.taste.sync(content.embeddings, content.movie_index)
+        return True
+    
+    @timed('engine.get_taste_recommendations')
+    def get_taste_recommendations(self, user_id, limit=10):
+        """Content-based recommendations from the user's taste vector (one matrix-vector product)"""
+        from models import Movie
+        
+        if not self._taste_profiles_ready():
+            return []
+        self.sync_content_index()
         
-        if pref and pref.favorite_genres:
-            genres = pref.favorite_genres.split(',')
-            genre_filter = '|'.join(genres)
-            query = query.filter(Movie.genres.op('REGEXP')(genre_filter))
+        vector, _ = self.taste.profile(user_id)
+        norm = np.linalg.norm(vector) if vector is not None else 0.0
+        if not norm:
+            return []
         
-        if pref and pref.preferred_languages:
-            languages = pref.preferred_languages.split(',')
-            query = query.filter(Movie.language.in_(languages))
+        content = self.content_index
+        embeddings, movie_ids = content.embeddings, content.movie_ids
+        scores = embeddings @ (vector / norm)
+        # Skip movies the user already watched or rated
+        seen_rows = self.seen.get(user_id).mask(np.asarray(movie_ids[:len(scores)]))
+        scores[seen_rows] = -np.inf
         
-        # Get popular movies
-        movies = query.order_by(
-            Movie.popularity.desc(),
-            Movie.avg_rating.desc()
-        ).limit(limit).all()
+        k = min(limit, len(scores) - int(seen_rows.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top_scores = {movie_ids[i]: float(scores[i]) for i in top}
+        
+        # Filter movies that have valid poster URLs
+        movies = Movie.query.filter(
+            Movie.id.in_(list(top_scores)),
+            Movie.poster_url.isnot(None),
+            Movie.poster_url != ''
+        ).all()
         
         return [{
             **movie.to_dict(),
-            'reason': 'Popular in your preferred genres'
+            'similarity_score': top_scores[movie.id],
+            'reason': 'Similar content to your selection'
         } for movie in movies]
     
-    def get_trending_movies(self, days=7, limit=20):
-        """Get trending movies based on recent activity"""
-        from models import Movie, Rating, WatchHistory, db
-        from sqlalchemy import func
-        
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        # Get movies with most recent ratings and views, filter those with valid posters
-        trending = db.session.query(
-            Movie,
-            func.count(Rating.id).label('rating_count'),
-            func.count(WatchHistory.id).label('view_count')
-        ).outerjoin(Rating, Movie.id == Rating.movie_id)\
-         .outerjoin(WatchHistory, Movie.id == WatchHistory.movie_id)\
-         .filter(
-             Movie.poster_url.isnot(None),
-             Movie.poster_url != '',
-             (Rating.timestamp >= cutoff_date) | (WatchHistory.watched_at >= cutoff_date)
-         ).group_by(Movie.id)\
-         .order_by(
-             (func.count(Rating.id) + func.count(WatchHistory.id)).desc()
-         ).limit(limit).all()
+    @timed('engine.get_also_watched')
+    def get_also_watched(self, movie_id, limit=6):
+        """Movies most often watched or highly rated by viewers of this one"""
+        from models import Movie
+        
+        # Loaded by the warm-up, or in the background on first use
+        self.co_occurrence.refresh()
+        
+        # Ask for every kept counter so the poster filter can't leave the block short
+        ranked = self.co_occurrence.top(movie_id, self.co_occurrence.capacity)
+        if not ranked:
+            return []
+        
+        # Filter movies that have valid poster URLs, keeping the ranked order
+        movies = Movie.query.filter(
+            Movie.id.in_([other_id for other_id, _ in ranked]),
+            Movie.poster_url.isnot(None),
+            Movie.poster_url != ''
+        ).all()
+        movies_by_id = {movie.id: movie for movie in movies}
         
         return [{
-            **movie.to_dict(),
-            'trending_score': rating_count + view_count,
-            'reason': f'Trending in last {days} days'
-        } for movie, rating_count, view_count in trending]
+            **movies_by_id[other_id].to_dict(),
+            'co_watch_count': count,
+            'reason': 'Viewers also watched'
+        } for other_id, count in ranked if other_id in movies_by_id][:limit]
     
     def get_similar_movies(self, movie_id, limit=6):
         """Get similar movies for a given movie"""
@@ -271,5 +929,31 @@ class RecommendationEngine:
     
     def update_user_profile(self, user_id):
         """Update user profile after new rating"""
-        # Rebuild collaborative model
-        self.build_collaborative_model()
+        if not Config.COLLABORATIVE_OUT_OF_CORE:
+            # Rebuild collaborative model
+            self.build_collaborative_model()
+            return
+        
+        # Out of core a fit streams the whole ratings table several times:
+        # retrain in the background, at most once per retrain interval
+        self._schedule_collaborative_retrain()
+    
+    def _schedule_collaborative_retrain(self):
+        from concurrency import submit_in_app_context
+        
+        if time.monotonic() - self._collaborative_trained_at < Config.COLLABORATIVE_RETRAIN_INTERVAL:
+            return
+        if not self._collaborative_retrain_lock.acquire(blocking=False):
+            return  # a retrain is already running
+        
+        def retrain():
+            try:
+                self.build_collaborative_model(out_of_core=True)
+            finally:
+                self._collaborative_retrain_lock.release()
+        
+        try:
+            submit_in_app_context(retrain)
+        except Exception:
+            self._collaborative_retrain_lock.release()
+            raise
@@ -0,0 +1,179 @@
+"""
+Recommendation Store - Precomputed per-user recommendation lists
+
+Usage:
+    python recommendation_store.py precompute [workers]  - Recompute every user's list
+    python recommendation_store.py stats                 - Show store statistics
+    python recommendation_store.py clear                 - Remove all stored lists
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from config import Config
+
+
+class RecommendationStore:
+    """Keyed store of each user's top-N hybrid recommendations.
+
+    Entries are written by the offline ``precompute`` job and are served
+    only while they are fresh: same model version, younger than
+    ``max_age`` and not invalidated by a later rating or preference change.
+    A hit costs two primary-key reads plus a zlib decompress.
+
+    ``invalidate`` records when a user's list went stale, and a list
+    computed before that time is neither written nor served, so a
+    precompute job that scored the user before the change can't bring
+    the old list back.
+    """
+
+    def __init__(self, model_version=Config.RECOMMENDATION_MODEL_VERSION,
+                 max_age=timedelta(hours=Config.PRECOMPUTED_MAX_AGE_HOURS)):
+        self.model_version = model_version
+        self.max_age = max_age
+
+    def get(self, user_id):
+        """Stored recommendations for a user, or None when missing or stale"""
+        from models import db, PrecomputedRecommendation, RecommendationInvalidation
+
+        entry = db.session.get(PrecomputedRecommendation, user_id)
+
+        if entry is None or entry.model_version != self.model_version:
+            return None
+        if datetime.now() - entry.computed_at > self.max_age:
+            return None
+        invalidation = db.session.get(RecommendationInvalidation, user_id)
+        if invalidation is not None and entry.computed_at <= invalidation.invalidated_at:
+            return None
+
+        return json.loads(zlib.decompress(entry.payload))
+
+    def put_many(self, entries, computed_at=None):
+        """Replace stored lists for ``[(user_id, recommendations), ...]``; returns how many (caller commits).
+
+        ``computed_at`` is when the data the lists were scored from was
+        read; users invalidated since then are skipped.
+        """
+        from models import db, PrecomputedRecommendation, RecommendationInvalidation
+
+        computed_at = computed_at or datetime.now()
+        invalidated = {
+            user_id for (user_id,) in db.session.query(RecommendationInvalidation.user_id).filter(
+                RecommendationInvalidation.user_id.in_([user_id for user_id, _ in entries]),
+                RecommendationInvalidation.invalidated_at >= computed_at
+            )
+        } if entries else set()
+        entries = [(user_id, recs) for user_id, recs in entries if user_id not in invalidated]
+        if not entries:
+            return 0
+
+        table = PrecomputedRecommendation.__table__
+
+        db.session.execute(
+            table.delete().where(table.c.user_id.in_([user_id for user_id, _ in entries]))
+        )
+        db.session.execute(table.insert(), [{
+            'user_id': user_id,
+            'model_version': self.model_version,
+            'payload': zlib.compress(json.dumps(recs, separators=(',', ':')).encode('utf-8')),
+            'computed_at': computed_at
+        } for user_id, recs in entries])
+        return len(entries)
+
+    def invalidate(self, *user_ids):
+        """Drop stored lists so the next request is scored online (caller commits)"""
+        from models import db, PrecomputedRecommendation, RecommendationInvalidation
+
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+        table = PrecomputedRecommendation.__table__
+        db.session.execute(table.delete().where(table.c.user_id.in_(user_ids)))
+
+        markers = RecommendationInvalidation.__table__
+        now = datetime.now()
+        db.session.execute(markers.delete().where(markers.c.user_id.in_(user_ids)))
+        db.session.execute(markers.insert(), [
+            {'user_id': user_id, 'invalidated_at': now} for user_id in user_ids
+        ])
+
+    def precompute(self, engine=None, limit=Config.PRECOMPUTED_LIMIT, workers=4, chunk_size=1000):
+        """Score every user with the batch recommender and store the results"""
+        from models import db, Movie, RecommendationInvalidation
+        from batch_recommender import BatchRecommender
+
+        # Stamped before any data is read: changes after this invalidate the lists
+        computed_at = datetime.now()
+        batch = BatchRecommender(engine, limit=limit, workers=workers).prepare()
+        movies = {movie.id: movie.to_dict() for movie in Movie.query.all()}
+
+        written = 0
+        chunk = []
+
+        for user_id, recs in batch.iter_recommendations():
+            chunk.append((user_id, [{
+                **movies[rec['movie_id']],
+                **({'score': rec['score']} if rec['score'] is not None else {}),
+                'reason': rec['reason']
+            } for rec in recs]))
+
+            if len(chunk) >= chunk_size:
+                written += self.put_many(chunk, computed_at)
+                db.session.commit()
+                chunk = []
+
+        written += self.put_many(chunk, computed_at)
+
+        # A marker older than max_age only rejects lists that are stale anyway
+        RecommendationInvalidation.query.filter(
+            RecommendationInvalidation.invalidated_at < datetime.now() - self.max_age
+        ).delete()
+        db.session.commit()
+
+        return written
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from db_context import create_db_app
+    from models import db, PrecomputedRecommendation
+    app = create_db_app()
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    store = RecommendationStore()
+
+    with app.app_context():
+        db.create_all()
+
+        if command == 'precompute':
+            workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+            start = time.perf_counter()
+            count = store.precompute(workers=workers)
+            print(f"🎉 Stored recommendations for {count} users "
+                  f"(model {store.model_version}) in {time.perf_counter() - start:.1f}s")
+
+        elif command == 'stats':
+            total = PrecomputedRecommendation.query.count()
+            current = PrecomputedRecommendation.query.filter_by(model_version=store.model_version).count()
+            fresh = PrecomputedRecommendation.query.filter(
+                PrecomputedRecommendation.model_version == store.model_version,
+                PrecomputedRecommendation.computed_at >= datetime.now() - store.max_age
+            ).count()
+
+            print("\n📊 Precomputed Recommendation Store:")
+            print("=" * 60)
+            print(f"Stored users:              {total}")
+            print(f"Current model version:     {current} (version {store.model_version})")
+            print(f"Fresh entries:             {fresh}")
+            print("=" * 60)
+
+        elif command == 'clear':
+            count = PrecomputedRecommendation.query.delete()
+            db.session.commit()
+            print(f"✅ Removed {count} stored recommendation lists")
+
+        else:
+            print(__doc__.strip())
@@ -0,0 +1,147 @@
+"""
+Responses - Pagination, field projection, compression and JSON encoding for API lists
+
+orjson and brotli are used when installed; without them responses are
+encoded with the standard library and compressed with gzip only.
+"""
+
+import base64
+import gzip
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Everything a poster grid renders
+FIELD_PRESETS = {
+    'grid': ('id', 'title', 'poster_url', 'avg_rating'),
+}
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+class InvalidCursor(ValueError):
+    """Raised for a pagination cursor that was not issued by this API"""
+
+
+def encode_cursor(offset):
+    payload = json.dumps({'o': offset}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, max_offset=Config.API_MAX_OFFSET):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))['o']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise InvalidCursor('Invalid cursor')
+    if offset > max_offset:
+        raise InvalidCursor('Cursor is past the end of the list')
+    return offset
+
+
+def page_params(default_limit=20, max_limit=Config.API_MAX_PAGE_SIZE, max_offset=Config.API_MAX_OFFSET):
+    """``(offset, limit)`` from the request's ``cursor`` and ``limit`` args.
+
+    Raises ``InvalidCursor`` for a malformed cursor or one deeper than
+    ``max_offset``, so a request never makes us rank more than
+    ``max_offset + max_limit + 1`` items.
+    """
+    from flask import request
+
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = min(max(limit, 1), max_limit)
+    cursor = request.args.get('cursor')
+    offset = decode_cursor(cursor, max_offset) if cursor else 0
+    return offset, limit
+
+
+def paginate(items, offset, limit, max_offset=Config.API_MAX_OFFSET):
+    """Slice one page out of a ranked list fetched with ``offset + limit + 1`` entries.
+
+    Returns ``(page, next_cursor)``; the cursor is None on the last page,
+    including the last one within ``max_offset``.
+    """
+    page = items[offset:offset + limit]
+    has_more = len(items) > offset + limit and offset + limit <= max_offset
+    next_cursor = encode_cursor(offset + limit) if has_more else None
+    return page, next_cursor
+
+
+def requested_fields():
+    """Field names from ``fields=`` (a preset name or a comma-separated list), or None for all"""
+    from flask import request
+
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    if fields in FIELD_PRESETS:
+        return FIELD_PRESETS[fields]
+    return ('id',) + tuple(name.strip() for name in fields.split(',') if name.strip() and name.strip() != 'id')
+
+
+def project(items, fields):
+    """Keep only ``fields`` of each item dict (all of them when ``fields`` is None)"""
+    if fields is None:
+        return items
+    return [{name: item[name] for name in fields if name in item} for item in items]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that skips key sorting and uses orjson when it is available"""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs.get('indent'):
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return super().dumps(obj, **kwargs)
+
+
+def init_compression(app, min_size=Config.COMPRESS_MIN_SIZE, level=Config.COMPRESS_LEVEL):
+    """Compress responses with brotli or gzip according to ``Accept-Encoding``"""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(body, quality=level))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(body, compresslevel=level))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            return response
+
+        # Same entity in a different encoding: the validator becomes weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return app
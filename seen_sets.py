@@ -0,0 +1,136 @@
+"""
+Seen Sets - Per-user bitmaps of watched or rated movies, for excluding them from recommendations
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import Config
+
+
+class SeenSet:
+    """Packed bit array over movie ids: bit ``i`` is set when movie ``i`` was seen.
+
+    ``mask(ids)`` answers membership for a whole candidate array at once.
+    ``add`` replaces the array instead of growing it in place, so readers
+    holding the old one are never affected.
+    """
+
+    __slots__ = ('bits', 'count', 'loaded_at')
+
+    def __init__(self, movie_ids=(), loaded_at=None):
+        ids = np.asarray(list(movie_ids), dtype=np.int64)
+        size = int(ids.max()) + 1 if len(ids) else 0
+        flags = np.zeros(size, dtype=bool)
+        flags[ids] = True
+        self.bits = np.packbits(flags, bitorder='little')
+        self.count = int(flags.sum())
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, movie_id):
+        return bool(self.mask(np.array([movie_id]))[0])
+
+    def add(self, movie_id):
+        byte, bit = divmod(movie_id, 8)
+        if byte < len(self.bits) and self.bits[byte] >> bit & 1:
+            return
+        bits = self.bits
+        if byte >= len(bits):
+            bits = np.concatenate([bits, np.zeros(byte + 1 - len(bits), dtype=np.uint8)])
+        else:
+            bits = bits.copy()
+        bits[byte] |= np.uint8(1 << bit)
+        self.bits = bits
+        self.count += 1
+
+    def mask(self, movie_ids):
+        """Boolean array, True where ``movie_ids[i]`` was seen"""
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        bits = self.bits
+        inside = (ids >= 0) & (ids < len(bits) * 8)
+        result = np.zeros(len(ids), dtype=bool)
+        inside_ids = ids[inside]
+        result[inside] = (bits[inside_ids >> 3] >> (inside_ids & 7)) & 1 == 1
+        return result
+
+    def ids(self):
+        return np.flatnonzero(np.unpackbits(self.bits, bitorder='little'))
+
+    def filter(self, items, limit=None):
+        """Items (dicts with an ``id``) that were not seen, in order, at most ``limit``"""
+        if not self.count or not items:
+            return items[:limit]
+        keep = np.flatnonzero(~self.mask([item['id'] for item in items]))
+        return [items[i] for i in keep[:limit]]
+
+
+class SeenSets:
+    """``SeenSet`` per user for the ``max_users`` most recently active users.
+
+    A user's set is loaded with one query on first use and kept current by
+    ``add`` on this process's rating and watch writes. It is reloaded once
+    it is ``ttl`` seconds old, so writes by other processes show up within
+    that time. One packed bitmap per user costs about max_movie_id / 8
+    bytes.
+    """
+
+    def __init__(self, max_users=Config.SEEN_SET_MAX_USERS, ttl=Config.SEEN_SET_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """The user's SeenSet (empty for anonymous users)"""
+        if user_id is None:
+            return SeenSet()
+
+        with self._lock:
+            seen = self._sets.get(user_id)
+            if seen is not None and time.monotonic() - seen.loaded_at < self.ttl:
+                self._sets.move_to_end(user_id)
+                return seen
+
+        self.preload([user_id])
+        with self._lock:
+            seen = self._sets.get(user_id)
+        return seen if seen is not None else SeenSet()
+
+    def preload(self, user_ids):
+        """Load the sets of many users at once (used for batch scoring)"""
+        from models import db, Rating, WatchHistory
+
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+
+        loaded_at = time.monotonic()
+        movies = {user_id: [] for user_id in user_ids}
+        # Chunked to stay under the database's bound-parameter limit
+        for i in range(0, len(user_ids), 400):
+            chunk = user_ids[i:i + 400]
+            rows = db.session.query(Rating.user_id, Rating.movie_id).filter(Rating.user_id.in_(chunk)).union(
+                db.session.query(WatchHistory.user_id, WatchHistory.movie_id).filter(WatchHistory.user_id.in_(chunk))
+            )
+            for user_id, movie_id in rows:
+                movies[user_id].append(movie_id)
+
+        with self._lock:
+            for user_id, movie_ids in movies.items():
+                self._sets[user_id] = SeenSet(movie_ids, loaded_at)
+                self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+
+    def add(self, user_id, movie_id):
+        """Mark a movie seen after a rating or watch write (no-op for users not loaded)"""
+        with self._lock:
+            seen = self._sets.get(user_id)
+            if seen is not None:
+                seen.add(movie_id)
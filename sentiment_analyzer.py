@@ -1,12 +1,30 @@
-from textblob import TextBlob
 import re
 
+from config import Config
+from metrics import timed
+
+def empty_summary():
+    """Review summary for a movie without (analyzed) reviews"""
+    return {
+        'overall_sentiment': 'neutral',
+        'positive_count': 0,
+        'negative_count': 0,
+        'neutral_count': 0,
+        'avg_polarity': 0.0,
+        'total_reviews': 0
+    }
+
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None):
+        from cache import get_cache
+        
         self.sentiment_thresholds = {
             'positive': 0.1,
             'negative': -0.1
         }
+        
+        # Last computed review summary per movie, served when a fresh one is too slow
+        self.summaries = (cache or get_cache()).namespace('sentiment', Config.SENTIMENT_CACHE_TTL)
     
     def clean_text(self, text):
         """Clean and preprocess text"""
@@ -15,8 +33,11 @@ class SentimentAnalyzer:
         text = text.lower().strip()
         return text
     
+    @timed('sentiment.analyze_text')
     def analyze_text(self, text):
         """Analyze sentiment of a single text"""
+        from textblob import TextBlob  # deferred: pulls in NLTK
+        
         cleaned_text = self.clean_text(text)
         blob = TextBlob(cleaned_text)
         
@@ -36,6 +57,7 @@ class SentimentAnalyzer:
             'label': label
         }
     
+    @timed('sentiment.analyze_movie_reviews')
     def analyze_movie_reviews(self, movie_id):
         """Analyze all reviews for a movie"""
         from models import Review
@@ -43,14 +65,7 @@ class SentimentAnalyzer:
         reviews = Review.query.filter_by(movie_id=movie_id).all()
         
         if not reviews:
-            return {
-                'overall_sentiment': 'neutral',
-                'positive_count': 0,
-                'negative_count': 0,
-                'neutral_count': 0,
-                'avg_polarity': 0.0,
-                'total_reviews': 0
-            }
+            return empty_summary()
         
         sentiments = []
         positive_count = 0
@@ -81,7 +96,7 @@ class SentimentAnalyzer:
         else:
             overall = 'neutral'
         
-        return {
+        summary = {
             'overall_sentiment': overall,
             'positive_count': positive_count,
             'negative_count': negative_count,
@@ -89,6 +104,15 @@ class SentimentAnalyzer:
             'avg_polarity': avg_polarity,
             'total_reviews': len(reviews)
         }
+        
+        self.summaries.set(movie_id, summary)
+        
+        return summary
+    
+    def cached_movie_summary(self, movie_id):
+        """Last summary computed for a movie, or an empty one if there is none"""
+        summary = self.summaries.get(movie_id)
+        return summary if summary is not None else empty_summary()
     
     def get_sentiment_keywords(self, sentiment):
         """Get keywords associated with sentiment"""
@@ -0,0 +1,185 @@
+"""
+Production Server - Prefork WSGI serving with models shared copy-on-write
+
+Usage:
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 5000] [--no-threads]
+
+The master process builds every model once, freezes the heap and then
+forks the workers, so all of them read the same physical pages for the
+embeddings, factors and indexes instead of each holding a private copy.
+Workers accept from one shared listening socket and are restarted if
+they die. /healthz reports liveness and /readyz reports once the models
+are loaded.
+"""
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from config import Config
+
+
+class PreforkServer:
+    """Fork ``workers`` copies of a WSGI app after it has been fully loaded"""
+
+    def __init__(self, app, host=Config.SERVER_HOST, port=Config.SERVER_PORT,
+                 workers=Config.SERVER_WORKERS, threaded=True, post_fork=None, pre_fork=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.threaded = threaded
+        self.post_fork = post_fork
+        self.pre_fork = pre_fork
+
+        self.children = {}
+        self.running = False
+        self.socket = None
+
+    def bind(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(1024)
+        self.socket.set_inheritable(True)
+
+    def run(self):
+        """Bind, fork the workers and supervise them until SIGTERM/SIGINT"""
+        self.bind()
+
+        if self.pre_fork:
+            self.pre_fork()
+
+        # Move everything allocated so far out of the GC's reach, so collections
+        # in the workers don't write to (and un-share) the model pages.
+        gc.collect()
+        gc.freeze()
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        print(f"🚀 Serving on http://{self.host}:{self.port} with {self.workers} workers "
+              f"(master pid {os.getpid()})")
+
+        while self.running:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            if pid in self.children and self.running:
+                print(f"⚠️  Worker {pid} exited with status {status}, restarting")
+                del self.children[pid]
+                time.sleep(0.5)
+                self._spawn()
+
+        self._shutdown()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            return
+
+        # Worker process
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            if self.post_fork:
+                self.post_fork()
+            self._serve()
+        finally:
+            os._exit(0)
+
+    def _serve(self):
+        from werkzeug.serving import make_server
+
+        server = make_server(
+            self.host, self.port, self.app,
+            threaded=self.threaded,
+            fd=self.socket.fileno()
+        )
+        try:
+            server.serve_forever()
+        except SystemExit:
+            pass
+        finally:
+            # Flush buffered events and other exit hooks before _exit(),
+            # without letting a repeated SIGTERM cut them short
+            import atexit
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            atexit._run_exitfuncs()
+
+    def _handle_stop(self, signum, frame):
+        # os.wait() is retried after a handler returns, so wake it by stopping the workers
+        self.running = False
+        self._signal_children(signal.SIGTERM)
+
+    def _signal_children(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self):
+        deadline = time.time() + 10
+        while self.children and time.time() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+
+        self._signal_children(signal.SIGKILL)
+
+        print("👋 Server stopped")
+
+
+def main():
+    import argparse
+    import app as app_module
+
+    parser = argparse.ArgumentParser(description='Run CineSense with preforked workers')
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS)
+    parser.add_argument('--no-threads', action='store_true', help='one request at a time per worker')
+    args = parser.parse_args()
+
+    app = app_module.create_app()
+
+    start = time.perf_counter()
+    app_module.warm_up_models()
+    print(f"📦 Models loaded in {time.perf_counter() - start:.1f}s")
+
+    if not hasattr(os, 'fork'):
+        print("⚠️  os.fork is unavailable on this platform, serving from a single process")
+        app.run(host=args.host, port=args.port, threaded=True)
+        return
+
+    PreforkServer(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threaded=not args.no_threads,
+        pre_fork=app_module.before_fork,
+        post_fork=app_module.after_fork
+    ).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -399,6 +399,7 @@ function renderMovieDetails(data) {
     const movie = data.movie;
     const sentiment = data.sentiment;
     const similar = data.similar_movies;
+    const alsoWatched = data.also_watched;
 
     // Use actual URLs only - no placeholders
     const backdropUrl = (movie.backdrop_url && movie.backdrop_url.startsWith('http')) ? movie.backdrop_url :
@@ -500,6 +501,17 @@ function renderMovieDetails(data) {
         `;
     }
 
+    if (alsoWatched && alsoWatched.length > 0) {
+        html += `
+            <div class="p-4 pt-0">
+                <h4 class="fw-bold mb-4"><i class="fas fa-users me-2"></i>Viewers Also Watched</h4>
+                <div class="movie-grid">
+                    ${alsoWatched.map(m => createMovieCard(m)).join('')}
+                </div>
+            </div>
+        `;
+    }
+
     document.getElementById('movieModalBody').innerHTML = html;
 }
 
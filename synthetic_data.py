@@ -0,0 +1,235 @@
+"""
+Synthetic Data Generator - Realistic catalog and activity data at any scale
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python synthetic_data.py --movies 10000 --users 50000 \\
+        --ratings 1000000 --reviews 50000 --watch 2000000
+
+Movie popularity and user activity follow power laws (a few blockbusters
+and heavy users, a long tail of everything else), so the generated data
+stresses the same hot spots production traffic does.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary',
+    'Drama', 'Family', 'Fantasy', 'History', 'Horror', 'Music', 'Musical', 'Mystery',
+    'Romance', 'Science Fiction', 'Sport', 'Thriller', 'War', 'Western'
+]
+
+LANGUAGES = ['en', 'en', 'en', 'en', 'fr', 'es', 'ko', 'ja', 'hi', 'de', 'it']
+
+GENRE_WORDS = {
+    'Action': ['explosive', 'chase', 'mission', 'fight', 'agent', 'rescue'],
+    'Adventure': ['journey', 'quest', 'treasure', 'expedition', 'island', 'legend'],
+    'Animation': ['colorful', 'talking', 'magical', 'friendship', 'kingdom', 'toy'],
+    'Biography': ['true', 'life', 'legacy', 'pioneer', 'career', 'struggle'],
+    'Comedy': ['hilarious', 'misadventure', 'awkward', 'prank', 'wedding', 'roommate'],
+    'Crime': ['heist', 'detective', 'mob', 'murder', 'gangster', 'corruption'],
+    'Documentary': ['investigation', 'footage', 'nature', 'history', 'interviews', 'truth'],
+    'Drama': ['family', 'loss', 'redemption', 'struggle', 'secret', 'choice'],
+    'Family': ['kids', 'holiday', 'home', 'pet', 'parents', 'adventure'],
+    'Fantasy': ['wizard', 'dragon', 'prophecy', 'realm', 'sword', 'spell'],
+    'History': ['empire', 'revolution', 'century', 'king', 'battle', 'dynasty'],
+    'Horror': ['haunted', 'demon', 'curse', 'nightmare', 'possessed', 'cabin'],
+    'Music': ['band', 'concert', 'singer', 'tour', 'album', 'rhythm'],
+    'Musical': ['broadway', 'dance', 'song', 'stage', 'chorus', 'audition'],
+    'Mystery': ['clue', 'disappearance', 'puzzle', 'suspect', 'riddle', 'secret'],
+    'Romance': ['love', 'heart', 'affair', 'wedding', 'soulmate', 'letters'],
+    'Science Fiction': ['space', 'robot', 'future', 'alien', 'planet', 'time'],
+    'Sport': ['team', 'championship', 'coach', 'underdog', 'match', 'season'],
+    'Thriller': ['conspiracy', 'hostage', 'stalker', 'escape', 'deadline', 'betrayal'],
+    'War': ['soldier', 'front', 'platoon', 'invasion', 'resistance', 'sacrifice'],
+    'Western': ['outlaw', 'sheriff', 'frontier', 'ranch', 'duel', 'saloon']
+}
+
+TITLE_WORDS = [
+    'Shadow', 'Night', 'Last', 'Silent', 'Broken', 'Golden', 'Dark', 'Lost', 'Red',
+    'Empire', 'City', 'River', 'Storm', 'Dream', 'Edge', 'Heart', 'Road', 'Fire',
+    'Winter', 'Secret', 'Kingdom', 'Echo', 'Hunter', 'Star', 'Glass', 'Iron', 'Wild'
+]
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie',
+               'Avery', 'Quinn', 'Rowan', 'Sasha', 'Kai', 'Noor', 'Mina', 'Leo']
+LAST_NAMES = ['Park', 'Garcia', 'Smith', 'Kim', 'Rossi', 'Novak', 'Silva', 'Khan',
+              'Dubois', 'Tanaka', 'Okafor', 'Larsen', 'Moreau', 'Singh', 'Cohen', 'Reyes']
+
+POSITIVE_PHRASES = ['Absolutely loved it', 'A wonderful, moving film', 'Great acting and a brilliant story',
+                    'One of the best movies this year', 'Fantastic from start to finish']
+NEUTRAL_PHRASES = ['It was okay', 'Decent but forgettable', 'An average watch', 'Fine for a quiet evening']
+NEGATIVE_PHRASES = ['Boring and far too long', 'A terrible script', 'Really disappointing',
+                    'The worst film I have seen in ages', 'Awful pacing and bad acting']
+
+
+def zipf_weights(n, exponent=1.1, rng=None):
+    """Normalized power-law weights for ``n`` items, shuffled so ids are not ranks"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    if rng is not None:
+        rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _person(rng):
+    return f"{FIRST_NAMES[rng.integers(len(FIRST_NAMES))]} {LAST_NAMES[rng.integers(len(LAST_NAMES))]}"
+
+
+def _sample_pairs(rng, n_pairs, user_weights, movie_weights):
+    """Draw distinct (user_row, movie_row) pairs with power-law marginals"""
+    n_movies = len(movie_weights)
+    pairs = np.empty(0, dtype=np.int64)
+
+    while len(pairs) < n_pairs:
+        needed = int((n_pairs - len(pairs)) * 1.2) + 1000
+        users = rng.choice(len(user_weights), needed, p=user_weights)
+        movies = rng.choice(n_movies, needed, p=movie_weights)
+        pairs = np.unique(np.concatenate([pairs, users * n_movies + movies]))
+
+    pairs = rng.permutation(pairs)[:n_pairs]
+    return pairs // n_movies, pairs % n_movies
+
+
+def generate_movies(rng, n_movies):
+    """Movie rows as dicts ready for a bulk insert"""
+    movies = []
+    directors = [_person(rng) for _ in range(max(10, n_movies // 8))]
+    actors = [_person(rng) for _ in range(max(30, n_movies // 2))]
+    director_weights = zipf_weights(len(directors), rng=rng)
+    actor_weights = zipf_weights(len(actors), rng=rng)
+    popularity = zipf_weights(n_movies, exponent=0.9) * n_movies * 10
+
+    for i in range(n_movies):
+        genres = list(rng.choice(GENRES, size=rng.integers(1, 4), replace=False))
+        words = [w for g in genres for w in GENRE_WORDS[g]]
+        overview = ' '.join(rng.choice(words, size=rng.integers(12, 30)))
+        title = ' '.join(rng.choice(TITLE_WORDS, size=rng.integers(1, 4)))
+
+        movies.append({
+            'title': f"{title} {i}",
+            'overview': overview.capitalize() + '.',
+            'genres': ','.join(genres),
+            'release_date': date(1950, 1, 1) + timedelta(days=int(rng.integers(0, 27000))),
+            'runtime': int(rng.normal(115, 20)),
+            'language': LANGUAGES[rng.integers(len(LANGUAGES))],
+            'poster_url': f'https://image.tmdb.org/t/p/w500/synthetic{i}.jpg' if rng.random() > 0.03 else None,
+            'backdrop_url': f'https://image.tmdb.org/t/p/w1280/synthetic{i}.jpg',
+            'cast': ','.join(rng.choice(actors, size=3, replace=False, p=actor_weights)),
+            'director': directors[rng.choice(len(directors), p=director_weights)],
+            'avg_rating': round(float(np.clip(rng.normal(6.5, 1.2), 1, 10)), 1),
+            'vote_count': int(popularity[i] * 100),
+            'popularity': round(float(popularity[i]), 3)
+        })
+
+    return movies
+
+
+def generate(n_movies=1000, n_users=5000, n_ratings=100000, n_reviews=5000,
+             n_watch_events=200000, seed=42, chunk_size=50000, verbose=True):
+    """Insert a synthetic dataset into the current app's database"""
+    from models import db, User, Movie, Rating, Review, WatchHistory, UserPreference
+
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+    now = datetime.now()
+
+    def log(message):
+        if verbose:
+            print(message)
+
+    def insert(table, rows):
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(table.insert(), rows[start:start + chunk_size])
+        db.session.commit()
+
+    db.create_all()
+
+    log(f"🎬 Generating {n_movies} movies...")
+    insert(Movie.__table__, generate_movies(rng, n_movies))
+    movie_ids = np.array([movie_id for (movie_id,) in db.session.query(Movie.id).order_by(Movie.id)])
+    movie_quality = np.array([r for (r,) in db.session.query(Movie.avg_rating).order_by(Movie.id)])
+
+    log(f"👤 Generating {n_users} users...")
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    insert(User.__table__, [{
+        'username': f'synthetic_user_{first_user + i}',
+        'email': f'synthetic_user_{first_user + i}@example.com',
+        'password': 'synthetic',
+        'created_at': now - timedelta(days=int(rng.integers(0, 720)))
+    } for i in range(n_users)])
+    user_ids = np.arange(first_user, first_user + n_users)
+
+    insert(UserPreference.__table__, [{
+        'user_id': int(user_id),
+        'favorite_genres': ','.join(rng.choice(GENRES, size=rng.integers(1, 4), replace=False)),
+        'preferred_languages': 'en' if rng.random() < 0.7 else ''
+    } for user_id in user_ids if rng.random() < 0.3])
+
+    user_weights = zipf_weights(n_users, exponent=0.8, rng=rng)
+    movie_weights = zipf_weights(n_movies, exponent=1.0)
+
+    log(f"⭐ Generating {n_ratings} ratings...")
+    users, movies = _sample_pairs(rng, min(n_ratings, n_users * n_movies), user_weights, movie_weights)
+    values = np.clip(np.rint(movie_quality[movies] + rng.normal(0, 1.8, len(movies))), 1, 10)
+    ages = rng.exponential(60, len(movies))
+    insert(Rating.__table__, [{
+        'user_id': int(user_ids[u]),
+        'movie_id': int(movie_ids[m]),
+        'rating': float(v),
+        'timestamp': now - timedelta(days=float(a))
+    } for u, m, v, a in zip(users, movies, values, ages)])
+
+    log(f"💬 Generating {n_reviews} reviews...")
+    users, movies = _sample_pairs(rng, min(n_reviews, n_users * n_movies), user_weights, movie_weights)
+    reviews = []
+    for u, m in zip(users, movies):
+        quality = movie_quality[m] + rng.normal(0, 1.5)
+        phrases = POSITIVE_PHRASES if quality > 7 else NEGATIVE_PHRASES if quality < 5 else NEUTRAL_PHRASES
+        reviews.append({
+            'user_id': int(user_ids[u]),
+            'movie_id': int(movie_ids[m]),
+            'content': f"{random.choice(phrases)}. {random.choice(phrases)}!",
+            'created_at': now - timedelta(days=float(rng.exponential(90)))
+        })
+    insert(Review.__table__, reviews)
+
+    log(f"👀 Generating {n_watch_events} watch events...")
+    users = rng.choice(n_users, n_watch_events, p=user_weights)
+    movies = rng.choice(n_movies, n_watch_events, p=movie_weights)
+    ages = rng.exponential(20, n_watch_events)
+    insert(WatchHistory.__table__, [{
+        'user_id': int(user_ids[u]),
+        'movie_id': int(movie_ids[m]),
+        'watched_at': now - timedelta(days=float(a))
+    } for u, m, a in zip(users, movies, ages)])
+
+    log("🎉 Synthetic data generated!")
+
+    return {
+        'movies': n_movies,
+        'users': n_users,
+        'ratings': int(min(n_ratings, n_users * n_movies)),
+        'reviews': int(min(n_reviews, n_users * n_movies)),
+        'watch_events': n_watch_events
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fill the database (DATABASE_URL) with synthetic data')
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ratings', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=5000)
+    parser.add_argument('--watch', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from db_context import create_db_app
+    app = create_db_app()
+
+    with app.app_context():
+        generate(args.movies, args.users, args.ratings, args.reviews, args.watch, args.seed)
@@ -0,0 +1,142 @@
+"""
+Taste Profiles - Incrementally maintained per-user content taste vectors
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import Config
+
+
+class TasteProfiles:
+    """Rating-weighted sums of the content embeddings of each user's rated movies.
+
+    A rating ``r`` of a movie with embedding ``e`` contributes
+    ``(r - center) * e``, so liked movies pull the vector towards them and
+    disliked ones push it away. A new rating or a re-rating changes a
+    single term, an O(d) update. Vectors are built once from the ratings
+    table. ``update`` applies this process's writes, and ``sync`` picks up
+    ratings written by other processes: new rows by id, and re-rated rows
+    (an upsert keeps the id) by a timestamp window that reaches
+    ``sync_lag`` seconds before the previous check, because buffered
+    writes commit after the time they are stamped with. ``basis``
+    identifies the content model the vectors were built with; after a
+    refit they have to be rebuilt. Movies re-embedded without a refit keep
+    their old contribution until then.
+    """
+
+    def __init__(self, center=Config.TASTE_RATING_CENTER, sync_interval=Config.TASTE_SYNC_INTERVAL,
+                 sync_lag=Config.TASTE_SYNC_LAG):
+        self.center = center
+        self.sync_interval = sync_interval
+        self.sync_lag = timedelta(seconds=sync_lag)
+        self.basis = None
+
+        self._vectors = {}  # user_id -> unnormalized float32 vector
+        self._ratings = {}  # user_id -> {movie_id: rating}
+        self._last_id = 0  # highest rating id applied
+        self._checked_at = None  # wall-clock time of the last build or sync query
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def build(self, embeddings, movie_index, basis):
+        """Rebuild every vector from the ratings table"""
+        from scipy import sparse
+        from models import db, Rating
+
+        checked_at = datetime.now()
+        ratings = {}
+        last_id = 0
+        for rating_id, user_id, movie_id, rating in db.session.query(
+            Rating.id, Rating.user_id, Rating.movie_id, Rating.rating
+        ).yield_per(10000):
+            ratings.setdefault(user_id, {})[movie_id] = rating
+            last_id = max(last_id, rating_id)
+
+        # One sparse product: (users x movies weights) @ (movies x d embeddings)
+        user_ids = list(ratings)
+        rows, cols, weights = [], [], []
+        for row, user_id in enumerate(user_ids):
+            for movie_id, rating in ratings[user_id].items():
+                col = movie_index.get(movie_id)
+                if col is not None and col < len(embeddings):
+                    rows.append(row)
+                    cols.append(col)
+                    weights.append(rating - self.center)
+        matrix = sparse.csr_matrix(
+            (np.array(weights, dtype=np.float32), (rows, cols)),
+            shape=(len(user_ids), len(embeddings))
+        )
+        vectors = np.asarray(matrix @ embeddings, dtype=np.float32)
+
+        with self._lock:
+            self._vectors = dict(zip(user_ids, vectors))
+            self._ratings = ratings
+            self._last_id = last_id
+            self._checked_at = checked_at
+            self._synced_at = time.monotonic()
+            self.basis = basis
+
+    def update(self, user_id, movie_id, rating, embeddings, movie_index):
+        """Apply one new or changed rating in O(d)"""
+        with self._lock:
+            self._apply(user_id, movie_id, rating, embeddings, movie_index)
+
+    def sync(self, embeddings, movie_index, force=False):
+        """Apply ratings written (by any process) since the last build or sync.
+
+        Checks at most every ``sync_interval`` seconds unless ``force``.
+        Re-applying a rating already seen is a no-op.
+        """
+        from sqlalchemy import or_
+        from models import db, Rating
+
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return 0
+        self._synced_at = now
+
+        checked_at = datetime.now()
+        query = db.session.query(Rating.id, Rating.user_id, Rating.movie_id, Rating.rating)
+        if self._checked_at is not None:
+            query = query.filter(or_(
+                Rating.id > self._last_id,
+                Rating.timestamp >= self._checked_at - self.sync_lag
+            ))
+        rows = query.all()
+
+        with self._lock:
+            for rating_id, user_id, movie_id, rating in rows:
+                self._apply(user_id, movie_id, rating, embeddings, movie_index)
+                self._last_id = max(self._last_id, rating_id)
+            self._checked_at = checked_at
+        return len(rows)
+
+    def profile(self, user_id):
+        """``(vector, rated movie ids)``; the vector is None for a user without ratings"""
+        with self._lock:
+            return self._vectors.get(user_id), set(self._ratings.get(user_id, ()))
+
+    def rating_count(self, user_id):
+        with self._lock:
+            return len(self._ratings.get(user_id, ()))
+
+    def _apply(self, user_id, movie_id, rating, embeddings, movie_index):
+        user_ratings = self._ratings.setdefault(user_id, {})
+        previous = user_ratings.get(movie_id)
+        user_ratings[movie_id] = rating
+
+        delta = rating - (self.center if previous is None else previous)
+        col = movie_index.get(movie_id)
+        if not delta or col is None or col >= len(embeddings):
+            self._vectors.setdefault(user_id, np.zeros(embeddings.shape[1], dtype=np.float32))
+            return
+
+        vector = self._vectors.get(user_id)
+        if vector is None:
+            vector = np.zeros(embeddings.shape[1], dtype=np.float32)
+        # Replace rather than mutate: profile() readers may hold the old array
+        self._vectors[user_id] = vector + np.float32(delta) * embeddings[col]
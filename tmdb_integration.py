@@ -111,8 +111,9 @@ class TMDBClient:
 
 def update_movie_posters_from_tmdb():
     """Update all movies in database with TMDB posters"""
-    from app import app
+    from db_context import create_db_app
     from models import db, Movie
+    app = create_db_app()
     
     client = TMDBClient()
     
@@ -159,15 +160,21 @@ def update_movie_posters_from_tmdb():
         return updated_count
 
 
-def fetch_and_add_popular_movies(count=100):
-    """Fetch popular movies from TMDB and add to database"""
-    from app import app
+def fetch_and_add_popular_movies(count=100, engine=None):
+    """Fetch popular movies from TMDB and add to database
+    
+    Pass the running ``RecommendationEngine`` to add them to its content
+    index right away instead of on its next catalog sync.
+    """
+    from db_context import create_db_app
     from models import db, Movie
+    app = create_db_app()
     
     client = TMDBClient()
     
     with app.app_context():
         added_count = 0
+        added = []
         pages = (count // 20) + 1  # TMDB returns 20 per page
         
         print(f"🎬 Fetching {count} popular movies from TMDB...")
@@ -214,6 +221,7 @@ def fetch_and_add_popular_movies(count=100):
                     )
                     
                     db.session.add(movie)
+                    added.append(movie)
                     added_count += 1
                     print(f"✅ Added: {movie.title}")
                     
@@ -225,6 +233,10 @@ def fetch_and_add_popular_movies(count=100):
         
         db.session.commit()
         print(f"\n🎉 Added {added_count} movies from TMDB!")
+        
+        if engine is not None and added:
+            engine.update_content_items([movie.id for movie in added])
+        
         return added_count
 
 
@@ -0,0 +1,206 @@
+"""
+Trending Counters - Incrementally maintained, time-bucketed movie activity
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from config import Config
+
+HOUR = 3600
+DAY = 86400
+
+
+class TrendingCounters:
+    """Per-movie activity counts in hourly and daily buckets.
+
+    Every rating or watch event bumps one hourly and one daily bucket, so a
+    ``days=N`` window is answered by summing at most N daily (or 24*N
+    hourly) counters instead of scanning the history tables. An exponentially
+    decayed score is maintained alongside for "hot right now" rankings, and
+    ranked top-k lists are cached for ``refresh_interval`` seconds.
+
+    Each process counts the events it handles itself. ``refresh`` rebuilds
+    the counters from the database in the background once they are
+    ``reload_interval`` seconds old. That picks up the events every other
+    worker wrote, so their rankings converge. The rebuild fills fresh
+    counters and swaps them in. Events recorded during the rebuild are
+    applied again afterwards, so one committed while the tables were
+    being read may count twice until the next rebuild.
+    """
+
+    def __init__(self, hourly_retention=Config.TRENDING_HOURLY_RETENTION_HOURS,
+                 daily_retention=Config.TRENDING_DAILY_RETENTION_DAYS,
+                 half_life_hours=Config.TRENDING_HALF_LIFE_HOURS,
+                 top_k=Config.TRENDING_TOP_K,
+                 refresh_interval=Config.TRENDING_CACHE_SECONDS,
+                 reload_interval=Config.TRENDING_RELOAD_INTERVAL):
+        self.hourly_retention = hourly_retention
+        self.daily_retention = daily_retention
+        self.decay_rate = math.log(2) / (half_life_hours * HOUR)
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+
+        self._hourly = defaultdict(Counter)
+        self._daily = defaultdict(Counter)
+        self._decayed = Counter()
+        self._decay_origin = time.time()
+        self._top_cache = {}
+        self._pending = None  # events recorded while a rebuild is running
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = 0.0
+        self.loaded = False
+
+    def record(self, movie_id, timestamp=None, weight=1):
+        """Count one event for a movie"""
+        with self._lock:
+            self._add(movie_id, timestamp or datetime.now(), weight)
+
+    def record_many(self, events):
+        """Count a batch of ``(movie_id, timestamp)`` events"""
+        with self._lock:
+            for movie_id, timestamp in events:
+                self._add(movie_id, timestamp, 1)
+
+    def load_from_db(self):
+        """Rebuild the buckets from ratings and watch history inside the retention window"""
+        from models import db, Rating, WatchHistory
+
+        cutoff = datetime.now() - timedelta(days=self.daily_retention)
+        fresh = TrendingCounters(self.hourly_retention, self.daily_retention, top_k=self.top_k)
+        fresh.decay_rate = self.decay_rate
+
+        with self._lock:
+            self._pending = []
+
+        try:
+            # Each table is streamed on its own so nothing gets multiplied by a join
+            for column_movie, column_time in (
+                (Rating.movie_id, Rating.timestamp),
+                (WatchHistory.movie_id, WatchHistory.watched_at)
+            ):
+                rows = db.session.query(column_movie, column_time)\
+                    .filter(column_time >= cutoff)\
+                    .yield_per(10000)
+                fresh.record_many(rows)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._hourly, self._daily = fresh._hourly, fresh._daily
+            self._decayed, self._decay_origin = fresh._decayed, fresh._decay_origin
+            self._top_cache = {}
+            pending, self._pending = self._pending, None
+            for event in pending:
+                self._add(*event)
+
+        self._loaded_at = time.monotonic()
+        self.loaded = True
+
+    def ensure_loaded(self):
+        """Load on first use; concurrent first callers wait for a single load"""
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load_from_db()
+
+    def refresh(self):
+        """Start a background rebuild when the counters are ``reload_interval`` seconds old"""
+        from concurrency import submit_in_app_context
+
+        if time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        if not self._load_lock.acquire(blocking=False):
+            return  # a rebuild is already running
+
+        def reload():
+            try:
+                self.load_from_db()
+            finally:
+                self._load_lock.release()
+
+        try:
+            submit_in_app_context(reload)
+        except Exception:
+            self._load_lock.release()
+            raise
+
+    def window_counts(self, days):
+        """Event counts per movie over the last ``days`` days"""
+        now = time.time()
+
+        with self._lock:
+            self._prune(now)
+
+            if days * 24 <= self.hourly_retention:
+                first = int(now // HOUR) - days * 24 + 1
+                buckets = [c for hour, c in self._hourly.items() if hour >= first]
+            else:
+                first = int(now // DAY) - days + 1
+                buckets = [c for day, c in self._daily.items() if day >= first]
+
+            totals = Counter()
+            for bucket in buckets:
+                totals.update(bucket)
+
+        return totals
+
+    def decayed_scores(self):
+        """Exponentially decayed activity score per movie as of now"""
+        with self._lock:
+            scale = math.exp(-self.decay_rate * (time.time() - self._decay_origin))
+            return {movie_id: score * scale for movie_id, score in self._decayed.items()}
+
+    def top(self, days=Config.TRENDING_DAYS_DEFAULT, decay=False):
+        """Cached ``[(movie_id, score), ...]`` ranked by window count or decayed score"""
+        key = 'decay' if decay else days
+        cached = self._top_cache.get(key)
+
+        if cached and time.monotonic() - cached[0] < self.refresh_interval:
+            return cached[1]
+
+        scores = self.decayed_scores() if decay else self.window_counts(days)
+        ranked = heapq.nlargest(self.top_k, scores.items(), key=lambda x: x[1])
+
+        self._top_cache[key] = (time.monotonic(), ranked)
+        return ranked
+
+    def _add(self, movie_id, timestamp, weight):
+        ts = timestamp.timestamp()
+        self._hourly[int(ts // HOUR)][movie_id] += weight
+        self._daily[int(ts // DAY)][movie_id] += weight
+        self._add_decayed(movie_id, ts, weight)
+        if self._pending is not None:
+            self._pending.append((movie_id, timestamp, weight))
+
+    def _add_decayed(self, movie_id, ts, weight):
+        # Scores are kept relative to a moving origin so each event is O(1);
+        # rebase before the growth factor overflows a float.
+        exponent = self.decay_rate * (ts - self._decay_origin)
+        if exponent > 50:
+            self._rebase(ts)
+            exponent = 0.0
+        self._decayed[movie_id] += weight * math.exp(exponent)
+
+    def _rebase(self, new_origin):
+        scale = math.exp(-self.decay_rate * (new_origin - self._decay_origin))
+        for movie_id in list(self._decayed):
+            self._decayed[movie_id] *= scale
+        self._decay_origin = new_origin
+
+    def _prune(self, now):
+        oldest_hour = int(now // HOUR) - self.hourly_retention
+        for hour in [h for h in self._hourly if h < oldest_hour]:
+            del self._hourly[hour]
+
+        oldest_day = int(now // DAY) - self.daily_retention
+        for day in [d for d in self._daily if d < oldest_day]:
+            del self._daily[day]
@@ -3,10 +3,13 @@ Poster Validation Script - Validate and fix poster URLs
 """
 
 import requests
-from app import app
+from db_context import create_db_app
 from models import db, Movie
 from urllib.parse import urlparse
 
+# Database-only app: no routes or ML components needed here
+app = create_db_app()
+
 def is_valid_url(url):
     """Check if URL is properly formatted"""
     try: